@@ -0,0 +1,59 @@
+"""Login to the BMR controller."""
+
+from datetime import date
+from functools import wraps
+
+LOGIN_PATH = "/menu.html"
+LOGIN_ERROR_MARKER = "res_error_title"
+
+
+def bmrHash(value, day=None):
+    """Obfuscate `value` the way the controller expects login credentials:
+    every character is XORed with the day of month (today by default)
+    shifted by two bits and hex encoded.
+    """
+    if day is None:
+        day = date.today().day
+    output = ""
+    for c in value:
+        tmp = ord(c) ^ (day << 2)
+        output = output + hex(tmp)[2:].zfill(2)
+    return output.upper()
+
+
+def loginForm(user, password):
+    """Return the form data posted to `LOGIN_PATH` to log in."""
+    return {"loginName": bmrHash(user), "passwd": bmrHash(password)}
+
+
+def authenticated(func):
+    """Decorator for ensuring we are logged-in before calling any BMR API
+    endpoints.
+
+    Calls nested in another authenticated call (including the parallel
+    requests issued by `getAllRollerShutters()`) reuse the login of the
+    outer call instead of logging in again, see `Bmr.loggedIn()`. Unrelated
+    calls from other threads log in on their own.
+    """
+
+    @wraps(func)
+    def wrapped(self, *args, **kwargs):
+        if self._hooks:
+            return _traced(self, func, args, kwargs)
+        with self.loggedIn():
+            return func(self, *args, **kwargs)
+
+    return wrapped
+
+
+def _traced(self, func, args, kwargs):
+    """Call `func` of an `authenticated` method, emitting the call hooks."""
+    self._emit("before_call", method=func.__name__, args=args)
+    try:
+        with self.loggedIn():
+            result = func(self, *args, **kwargs)
+    except Exception as e:
+        self._emit("after_call", method=func.__name__, error=e)
+        raise
+    self._emit("after_call", method=func.__name__, error=None)
+    return result
@@ -0,0 +1,84 @@
+"""Caching of `Bmr` getter results."""
+
+from collections import OrderedDict
+from functools import wraps
+import time
+from typing import NamedTuple
+
+from pybmr.const import QUALITY_GOOD
+
+
+class ReadInfo(NamedTuple):
+    """Information about the value returned by the last read, see
+    `Bmr.lastRead`.
+    """
+
+    age: float  # seconds since the value was loaded from the controller
+    stale: bool  # True if the value is older than the cache TTL
+    quality: str = QUALITY_GOOD  # one of the QUALITY_* constants
+    unchanged: bool = False  # True if reloaded, but the controller returned the same data
+
+
+class _CacheEntry(NamedTuple):
+    value: object
+    time: float
+    quality: str
+
+
+def _emitCacheHit(self, name, args, age, stale):
+    """Emit the cache hit within the call hooks of the method, like the
+    hooks of a miss are emitted within them by `authenticated`.
+    """
+    self._emit("before_call", method=name, args=args)
+    self._emit("on_cache_hit", method=name, args=args, age=age, stale=stale)
+    self._emit("after_call", method=name, error=None)
+
+
+def cached(permanent=False, validator=None):
+    """Decorator caching results of a `Bmr` getter per client instance and
+    arguments. Values expire after the `cache_ttl` of the client unless
+    `permanent`.
+
+    In the stale-while-revalidate mode an expired value is returned
+    immediately and refreshed in the background, unless it's older than
+    `cache_ttl + max_stale`.
+
+    `validator` is a function returning True if the loaded value is valid.
+    Malformed or invalid values are re-fetched up to `validate_retries`
+    times, then the last valid value is returned instead, see
+    `Bmr._fetch()`.
+    """
+
+    def decorator(func):
+        name = func.__name__
+
+        @wraps(func)
+        def wrapped(self, *args, **kwargs):
+            key = args + tuple(sorted(kwargs.items()))
+            with self._cache_lock:
+                cache = self._caches.setdefault(name, OrderedDict())
+                entry = cache.get(key)
+                if entry is not None:
+                    cache.move_to_end(key)
+            if entry is not None:
+                age = time.monotonic() - entry.time
+                if permanent or age < self._cache_ttl:
+                    self._local.read = ReadInfo(age, False, entry.quality)
+                    if self._hooks:
+                        _emitCacheHit(self, name, args, age, False)
+                    return entry.value
+                if self._stale_while_revalidate and age < self._cache_ttl + self._max_stale:
+                    self._revalidate(func, name, key, validator, args, kwargs)
+                    self._local.read = ReadInfo(age, True, entry.quality)
+                    if self._hooks:
+                        _emitCacheHit(self, name, args, age, True)
+                    return entry.value
+            self._local.unchanged = False
+            value, quality = self._fetch(func, name, key, validator, args, kwargs)
+            self._store(name, key, value, quality)
+            self._local.read = ReadInfo(0.0, False, quality, quality == QUALITY_GOOD and self._local.unchanged)
+            return value
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,883 @@
+"""The BMR HC64 client."""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from hashlib import sha256
+import json
+import logging
+from threading import Lock, Thread, local
+import time
+from typing import NamedTuple
+
+from pybmr.auth import LOGIN_ERROR_MARKER, LOGIN_PATH, authenticated, loginForm
+from pybmr.cache import _CacheEntry, cached
+from pybmr.const import (
+    CACHE_DEFAULT_MAX_STALE,
+    CACHE_DEFAULT_MAXSIZE,
+    CACHE_DEFAULT_TTL,
+    FEATURE_ENDPOINTS,
+    FEATURE_PROBES,
+    HOOK_EVENTS,
+    HTTP_DEFAULT_MAX_RETRIES,
+    HTTP_DEFAULT_MAX_WORKERS,
+    HTTP_DEFAULT_TIMEOUT,
+    NEGATIVE_CACHE_DEFAULT_BACKOFF,
+    NEGATIVE_CACHE_MAX_BACKOFF,
+    QUALITY_GOOD,
+    QUALITY_INVALID,
+    QUALITY_LAST_GOOD,
+    VALIDATE_DEFAULT_RETRIES,
+)
+from pybmr.errors import MalformedDataError, UnsupportedFeatureError
+from pybmr.parsers import (
+    _encodeAssignments,
+    _encodeCircuitSchedules,
+    _encodeLowMode,
+    _encodeSchedule,
+    _encodeSummerMode,
+    _malformed,
+    _validAssignments,
+    _validCircuit,
+    _validCircuitSchedules,
+    _validLowMode,
+    _validSchedule,
+    freeze,
+    parseAssignments,
+    parseCircuit,
+    parseCircuitSchedules,
+    parseLowMode,
+    parseNames,
+    parseSchedule,
+    parseSchedules,
+    validateSchedulePlan,
+)
+from pybmr.shutters import RollerShutterMixin
+from pybmr.transport import CaptureTransport, RequestsTransport, _redact
+
+logger = logging.getLogger(__name__)
+
+_ENDPOINT_FEATURES = {
+    path: feature for feature, paths in FEATURE_ENDPOINTS.items() for path in paths
+}
+
+
+class WriteInfo(NamedTuple):
+    """Information about the last write, see `Bmr.lastWrite`."""
+
+    sent: bool  # False if the write was skipped because it wouldn't change anything
+
+
+class PlanReport(NamedTuple):
+    """Result of `Bmr.applySchedulePlan()`. Keys are ("schedule",
+    schedule_id) or ("circuit", circuit_id).
+    """
+
+    written: list  # entries sent to the controller
+    skipped: list  # entries skipped because they wouldn't change anything
+    failed: dict  # entries that failed to be written -> error message
+    mismatches: list  # entries whose read back value differs from the plan
+    duration: float  # seconds
+
+
+class WarmUpReport(NamedTuple):
+    """Result of `Bmr.warmUp()`."""
+
+    ready: bool  # True if all metadata were loaded
+    timings: dict  # step -> seconds
+    errors: dict  # step -> error message
+    duration: float  # seconds
+
+
+class Bmr(RollerShutterMixin):
+    def __init__(
+        self,
+        base_url,
+        user,
+        password,
+        timeout=HTTP_DEFAULT_TIMEOUT,
+        max_retries=HTTP_DEFAULT_MAX_RETRIES,
+        cache_maxsize=CACHE_DEFAULT_MAXSIZE,
+        cache_ttl=CACHE_DEFAULT_TTL,
+        transport=None,
+        capture=None,
+        stale_while_revalidate=False,
+        max_stale=CACHE_DEFAULT_MAX_STALE,
+        validate_retries=VALIDATE_DEFAULT_RETRIES,
+        capabilities_file=None,
+        skip_noop_writes=False,
+        reuse_unchanged=False,
+    ):
+        """Create BMR client. `transport` is a `Transport` instance used to
+        talk to the controller, by default `RequestsTransport` created from
+        `base_url`, `timeout` and `max_retries`. When `capture` is a path,
+        all traffic is recorded to that file, see `CaptureTransport`.
+
+        Getters cache their results for `cache_ttl` seconds. With
+        `stale_while_revalidate` an expired result is returned immediately
+        while it's refreshed in the background, as long as it's no more than
+        `max_stale` seconds past the TTL. Check `lastRead` to see whether
+        the result was stale.
+
+        Malformed or implausible circuit, schedule and mode readings are
+        re-fetched up to `validate_retries` times, then the last valid value
+        is returned. `lastRead.quality` tells which one was returned.
+
+        Optional features (HDO, roller shutters, wind sensor) that fail are
+        not requested again for a while, calls fail immediately with
+        `UnsupportedFeatureError` instead. See `probeCapabilities()`, its
+        results are stored in `capabilities_file` if given.
+
+        With `skip_noop_writes` setters compare the new value with a fresh
+        cached reading and don't send it if it wouldn't change anything, see
+        `lastWrite`.
+
+        With `reuse_unchanged` getters return immutable values (mapping
+        proxies and tuples instead of dicts and lists). When the controller
+        returns exactly the same data as the last time, it isn't parsed
+        again and the same object is returned, with `lastRead.unchanged`
+        set, so callers can skip their work by checking identity.
+        """
+        self._base_url = base_url
+        self._user = user
+        self._password = password
+        self._capabilities_file = capabilities_file
+        self._capabilities = {}
+        self._feature_failures = {}
+        self._wind_status = None
+        self._wind_callbacks = []
+        self._hooks = {}
+
+        self._cache_maxsize = cache_maxsize
+        self._cache_ttl = cache_ttl
+        self._stale_while_revalidate = stale_while_revalidate
+        self._max_stale = max_stale
+        self._caches = {}
+        self._cache_lock = Lock()
+        self._refreshing = set()
+        self._validate_retries = validate_retries
+        self._skip_noop_writes = skip_noop_writes
+        self._reuse_unchanged = reuse_unchanged
+        self._parsed = {}
+        self._last_good = {}
+        self._local = local()
+
+        if transport is None:
+            transport = RequestsTransport(base_url, timeout=timeout, max_retries=max_retries)
+        # Session of the default transport, kept for backward compatibility
+        self._http = getattr(transport, "session", None)
+        if capture is not None:
+            transport = CaptureTransport(transport, capture)
+        self._transport = transport
+
+    def addHook(self, event, callback):
+        """Register `callback` called with keyword arguments on `event`, one
+        of `HOOK_EVENTS`:
+
+          before_call     method, args            an API method is called
+          after_call      method, error           the API method returned or raised `error`
+          before_request  path, data              a request is sent (credentials redacted)
+          after_response  path, response, duration, error
+          on_retry        path, method, retries, reason   "http" retries done by the
+                                                  transport, "validation" re-fetches
+          on_parse        parser, duration        a response was parsed
+          on_cache_hit    method, args, age, stale
+
+        Durations are in seconds. Cache hits are emitted between the call
+        hooks of the method, like the requests of a miss. Exceptions raised
+        by callbacks are logged and ignored. Without any hooks the client doesn't collect anything.
+        """
+        if event not in HOOK_EVENTS:
+            raise Exception("Unknown hook event {}".format(event))
+        self._hooks = dict(self._hooks, **{event: self._hooks.get(event, ()) + (callback,)})
+
+    def removeHook(self, event, callback):
+        """Unregister `callback` registered by `addHook()`."""
+        callbacks = tuple(c for c in self._hooks.get(event, ()) if c != callback)
+        self._hooks = {e: c for e, c in dict(self._hooks, **{event: callbacks}).items() if c}
+
+    def _emit(self, event, **fields):
+        for callback in self._hooks.get(event, ()):
+            try:
+                callback(**fields)
+            except Exception:
+                logger.exception("Hook %s failed", event)
+
+    def _post(self, path, data, probe=False):
+        """Post `data` to `path` using the transport, emitting the request
+        hooks. With `probe` the request is sent once, without retries.
+        """
+        send = self._transport.probe if probe else self._transport.post
+        if not self._hooks:
+            return send(path, data)
+        self._emit("before_request", path=path, data=_redact(data))
+        start = time.perf_counter()
+        try:
+            response = send(path, data)
+        except Exception as e:
+            self._emit(
+                "after_response", path=path, response=None, duration=time.perf_counter() - start, error=e
+            )
+            raise
+        if response.retries:
+            self._emit("on_retry", path=path, method=None, retries=response.retries, reason="http")
+        self._emit(
+            "after_response", path=path, response=response, duration=time.perf_counter() - start, error=None
+        )
+        return response
+
+    def _parse(self, parser, *args):
+        """Call `parser` with `args` (the response text last), emitting the
+        parse hook. With `reuse_unchanged` return the previous value if the
+        text is the same as the last time for the same getter call.
+        """
+        if self._reuse_unchanged:
+            return self._parseUnchanged(parser, args)
+        if not self._hooks:
+            return parser(*args)
+        start = time.perf_counter()
+        try:
+            return parser(*args)
+        finally:
+            self._emit("on_parse", parser=parser.__qualname__, duration=time.perf_counter() - start)
+
+    def _parseUnchanged(self, parser, args):
+        key = (getattr(self._local, "getter", None), parser, args[:-1])
+        entry = self._parsed.get(key)
+        if entry is not None and entry[0] == args[-1]:
+            self._local.unchanged = True
+            return entry[1]
+        if self._hooks:
+            start = time.perf_counter()
+            value = freeze(parser(*args))
+            self._emit("on_parse", parser=parser.__qualname__, duration=time.perf_counter() - start)
+        else:
+            value = freeze(parser(*args))
+        self._parsed[key] = (args[-1], value)
+        return value
+
+    @property
+    def baseUrl(self):
+        """URL of the controller."""
+        return self._base_url
+
+    @property
+    def lastRead(self):
+        """`ReadInfo` of the last value returned by a getter in the current
+        thread.
+        """
+        return getattr(self._local, "read", None)
+
+    def _store(self, name, key, value, quality=QUALITY_GOOD):
+        with self._cache_lock:
+            cache = self._caches.setdefault(name, OrderedDict())
+            cache[key] = _CacheEntry(value, time.monotonic(), quality)
+            cache.move_to_end(key)
+            while len(cache) > self._cache_maxsize:
+                cache.popitem(last=False)
+
+    def _fetch(self, func, name, key, validator, args, kwargs):
+        """Load a value by calling the getter `func`. Return the value and its
+        quality.
+
+        If the controller returns malformed data or the value doesn't pass
+        the `validator`, try again up to `validate_retries` times. Then fall
+        back to the last valid value. If there isn't any, return the invalid
+        value, or raise the error if the data couldn't be parsed at all.
+        """
+        # Tell _parse() which getter call the parsed response belongs to
+        outer = getattr(self._local, "getter", None)
+        self._local.getter = (name, key)
+        try:
+            return self._fetchValidated(func, name, key, validator, args, kwargs)
+        finally:
+            self._local.getter = outer
+
+    def _fetchValidated(self, func, name, key, validator, args, kwargs):
+        if validator is None:
+            return func(self, *args, **kwargs), QUALITY_GOOD
+        invalid = error = None
+        for attempt in range(self._validate_retries + 1):
+            if attempt and self._hooks:
+                self._emit("on_retry", path=None, method=name, retries=attempt, reason="validation")
+            try:
+                value = func(self, *args, **kwargs)
+            except MalformedDataError as e:
+                error = e
+                continue
+            if validator(value):
+                with self._cache_lock:
+                    self._last_good[(name, key)] = value
+                return value, QUALITY_GOOD
+            invalid = value
+        with self._cache_lock:
+            last_good = self._last_good.get((name, key))
+        if last_good is not None:
+            return last_good, QUALITY_LAST_GOOD
+        if invalid is not None:
+            return invalid, QUALITY_INVALID
+        raise error
+
+    def _revalidate(self, func, name, key, validator, args, kwargs):
+        """Refresh a cached value in a background thread, unless it's already
+        being refreshed.
+        """
+        with self._cache_lock:
+            if (name, key) in self._refreshing:
+                return
+            self._refreshing.add((name, key))
+
+        def refresh():
+            try:
+                self._store(name, key, *self._fetch(func, name, key, validator, args, kwargs))
+            except Exception:
+                logger.exception("Failed to refresh %s%s", name, args)
+            finally:
+                with self._cache_lock:
+                    self._refreshing.discard((name, key))
+
+        Thread(target=refresh, name="bmr-refresh-{}".format(name), daemon=True).start()
+
+    @property
+    def lastWrite(self):
+        """`WriteInfo` of the last setter called in the current thread."""
+        return getattr(self._local, "write", None)
+
+    def close(self):
+        """Close the transport, e.g. the connection or the capture file."""
+        self._transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def clearCache(self):
+        """Drop all cached values."""
+        with self._cache_lock:
+            self._caches.clear()
+
+    def _invalidate(self, *names):
+        """Drop cached values of the getters `names` after a write. Also marks
+        the write as sent.
+        """
+        with self._cache_lock:
+            for name in names:
+                self._caches.pop(name, None)
+        self._local.write = WriteInfo(True)
+
+    def _isNoop(self, payload, current):
+        """Return True if writes should be skipped when they don't change
+        anything and `payload` is the same as the encoded current value,
+        returned by `current()`. The current value must be fresh and valid.
+        """
+        if not self._skip_noop_writes:
+            return False
+        try:
+            encoded = current()
+        except Exception:
+            return False
+        read = self.lastRead
+        if read.stale or read.quality != QUALITY_GOOD or encoded != payload:
+            return False
+        self._local.write = WriteInfo(False)
+        return True
+
+    @contextmanager
+    def loggedIn(self):
+        """Context manager logging in to the controller, unless already logged
+        in by an enclosing call in the same thread. Calls made inside reuse
+        the login, including calls from worker threads started through
+        `_withLogin()`.
+        """
+        depth = getattr(self._local, "login_depth", 0)
+        if not depth and not self._authenticate():
+            raise Exception("Authentication failed, check username/password")
+        self._local.login_depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.login_depth = depth
+
+    def _withLogin(self, func):
+        """Wrap `func` to be run by a worker thread on behalf of the calling
+        thread, which must be logged in. Calls made by `func` reuse that
+        login instead of logging in again.
+        """
+        if not getattr(self._local, "login_depth", 0):
+            return func
+
+        @wraps(func)
+        def wrapped(*args, **kwargs):
+            depth = getattr(self._local, "login_depth", 0)
+            self._local.login_depth = depth + 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.login_depth = depth
+
+        return wrapped
+
+    def warmUp(self, max_workers=HTTP_DEFAULT_MAX_WORKERS):
+        """Log in and load all static metadata (circuits, schedules, roller
+        shutters, capabilities) into the caches, using at most `max_workers`
+        parallel requests. Return `WarmUpReport` with the time spent on
+        every step. Unsupported optional features are not reported as errors.
+        """
+        start = time.monotonic()
+        timings, errors = {}, {}
+
+        def timed(name, func):
+            step_start = time.monotonic()
+            try:
+                func()
+            except UnsupportedFeatureError:
+                pass
+            except Exception as e:
+                errors[name] = str(e)
+            timings[name] = time.monotonic() - step_start
+
+        try:
+            with self.loggedIn():
+                timings["login"] = time.monotonic() - start
+                timed("probeCapabilities", self.probeCapabilities)
+                steps = [
+                    self.getNumCircuits,
+                    self.getCircuitNames,
+                    self.getSchedules,
+                    self.getNumOfRollerShutters,
+                    self.getListOfRollerShutters,
+                ]
+                with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                    list(pool.map(self._withLogin(lambda func: timed(func.__name__, func)), steps))
+                # Computed from the (now cached) circuit names
+                timed("getUniqueId", self.getUniqueId)
+        except Exception as e:
+            errors["login"] = str(e)
+        return WarmUpReport(not errors, timings, errors, time.monotonic() - start)
+
+    def _authenticate(self):
+        """Login to BMR controller. Note that BMR controller is using a kinda
+        weird and insecure authentication mechanism - it looks like it's
+        just remembering the username and IP address of the logged-in user.
+        """
+        response = self._post(LOGIN_PATH, loginForm(self._user, self._password))
+        if LOGIN_ERROR_MARKER in response.text:
+            return False
+        return True
+
+    def _request(self, path, data):
+        """Post `data` to the BMR API endpoint `path` and return the response
+        text.
+        """
+        feature = _ENDPOINT_FEATURES.get(path)
+        if feature is None:
+            response = self._post(path, data)
+        else:
+            self._checkFeature(feature)
+            try:
+                response = self._post(path, data)
+            except Exception:
+                self._featureFailed(feature)
+                raise
+            if response.status_code != 200:
+                self._featureFailed(feature)
+            else:
+                self._feature_failures.pop(feature, None)
+        if response.status_code != 200:
+            raise Exception(
+                "Server returned status code {}".format(response.status_code)
+            )
+        return response.text
+
+    def _checkFeature(self, feature):
+        if self._capabilities.get(feature) is False:
+            raise UnsupportedFeatureError(
+                "Controller doesn't support {}".format(feature)
+            )
+        failure = self._feature_failures.get(feature)
+        if failure is not None and time.monotonic() < failure[1]:
+            raise UnsupportedFeatureError(
+                "Controller failed to provide {}, not trying again for {:.0f} seconds".format(
+                    feature, failure[1] - time.monotonic()
+                )
+            )
+
+    def _featureFailed(self, feature):
+        """Don't request the feature again for a while. The backoff doubles
+        with every consecutive failure.
+        """
+        failures = self._feature_failures.get(feature, (0, 0))[0] + 1
+        backoff = min(
+            NEGATIVE_CACHE_DEFAULT_BACKOFF * 2 ** (failures - 1),
+            NEGATIVE_CACHE_MAX_BACKOFF,
+        )
+        self._feature_failures[feature] = (failures, time.monotonic() + backoff)
+
+    @authenticated
+    def probeCapabilities(self, refresh=False):
+        """Find out which optional features (see `FEATURE_ENDPOINTS`) the
+        controller supports. Return a dict of feature name -> bool.
+
+        The results are kept for the lifetime of the client and stored in
+        the `capabilities_file`, if given. Probes are sent once, without
+        retries, a feature whose probe fails is considered unsupported.
+        Features known to be unsupported fail immediately with
+        `UnsupportedFeatureError`. Pass `refresh` to probe the controller
+        again.
+        """
+        stored = {}
+        if self._capabilities_file is not None:
+            try:
+                with open(self._capabilities_file, encoding="utf-8") as fh:
+                    stored = json.load(fh)
+            except FileNotFoundError:
+                pass
+        if not refresh and self._base_url in stored:
+            self._capabilities = stored[self._base_url]
+            return dict(self._capabilities)
+
+        capabilities = {}
+        for feature, (path, data) in FEATURE_PROBES.items():
+            try:
+                response = self._post(path, data, probe=True)
+                capabilities[feature] = response.status_code == 200
+            except Exception:
+                capabilities[feature] = False
+        self._capabilities = capabilities
+        self._feature_failures.clear()
+
+        if self._capabilities_file is not None:
+            stored[self._base_url] = capabilities
+            with open(self._capabilities_file, "w", encoding="utf-8") as fh:
+                json.dump(stored, fh, indent=2)
+        return dict(capabilities)
+
+    @cached(permanent=True)
+    @authenticated
+    def getUniqueId(self):
+        """Return unique ID of the entity.
+
+        The BMR HC64 API doesn't provide anything that could be used as a
+        unique ID, such as serial number. Therefore we have to generate it
+        from something that doesn't usually change - such as circuit names.
+
+        Note that this is more like a unique ID for the whole HC64
+        controller, not a unique ID of a circuit.
+        """
+        return sha256(
+            b"\0".join([name.encode("utf-8") for name in self.getCircuitNames()])
+        ).hexdigest()[:8]
+
+    @cached(permanent=True)
+    @authenticated
+    def getNumCircuits(self):
+        """Get the number of heating circuits."""
+        data = {"param": "+"}
+        text = self._request("/numOfRooms", data)
+        return int(text)
+
+    @cached(permanent=True)
+    @authenticated
+    def getCircuitNames(self):
+        """Get the names of all heating circuits."""
+        data = {"param": "+"}
+        text = self._request("/listOfRooms", data)
+        return self._parse(parseNames, text)
+
+    @cached(validator=_validCircuit)
+    @authenticated
+    def getCircuit(self, circuit_id):
+        """Get circuit status.
+
+        Raw data returned from server:
+
+          1Pokoj 202 v  021.7+12012.0000.000.0000000000
+
+        Byte offsets of:
+          POS_ENABLED = 0
+          POS_NAME = 1
+          POS_ACTUALTEMP = 14
+          POS_REQUIRED = 19
+          POS_REQUIREDALL = 22
+          POS_USEROFFSET = 27
+          POS_MAXOFFSET = 32
+          POS_S_TOPI = 36
+          POS_S_OKNO = 37
+          POS_S_KARTA = 38
+          POS_VALIDATE = 39
+          POS_LOW = 42
+          POS_LETO = 43
+          POS_S_CHLADI = 44
+        """
+        data = {"param": circuit_id}
+        text = self._request("/wholeRoom", data)
+        return self._parse(parseCircuit, circuit_id, text)
+
+    @cached()
+    @authenticated
+    def getSchedules(self):
+        """Load schedules."""
+        data = {"param": "+"}
+        text = self._request("/listOfModes", data)
+        return self._parse(parseSchedules, text)
+
+    @cached(validator=_validSchedule)
+    @authenticated
+    def getSchedule(self, schedule_id):
+        """Load schedule settings."""
+        data = {"modeID": "{:02d}".format(schedule_id)}
+        text = self._request("/loadMode", data)
+        return self._parse(parseSchedule, schedule_id, text)
+
+    @authenticated
+    def setSchedule(self, schedule_id, name, timetable):
+        """Save schedule settings. Name is the new schedule name. Timetable is
+        a list of tuples of time and target temperature. When the schedule is
+        associated with a circuit BMR heating controller will use the
+        schedule timetable to set the target temperature at the specified
+        time. Note that the first entry in the timetable must be always for
+        time "00:00".
+        """
+        payload = _encodeSchedule(schedule_id, name, timetable)
+
+        def current():
+            schedule = self.getSchedule(schedule_id)
+            return _encodeSchedule(schedule_id, schedule["name"], schedule["timetable"])
+
+        if self._isNoop(payload, current):
+            return True
+        text = self._request("/saveMode", {"modeSettings": payload})
+        self._invalidate("getSchedule", "getSchedules")
+        return "true" in text
+
+    @authenticated
+    def deleteSchedule(self, schedule_id):
+        """Delete schedule."""
+        data = {"modeID": "{:02d}".format(schedule_id)}
+        text = self._request("/deleteMode", data)
+        self._invalidate("getSchedule", "getSchedules")
+        return "true" in text
+
+    @authenticated
+    def applySchedulePlan(self, plan, verify=True, max_workers=HTTP_DEFAULT_MAX_WORKERS):
+        """Write all schedules and circuit schedules of the plan (see
+        `validateSchedulePlan()`) and return `PlanReport`.
+
+        The plan is validated before anything is written. The writes are sent
+        one by one, then all entries are read back in parallel (using at most
+        `max_workers` requests) and compared with the plan, unless `verify`
+        is False.
+        """
+        start = time.monotonic()
+        payloads = validateSchedulePlan(plan)
+        written, skipped, failed, mismatches = [], [], {}, []
+        for key in payloads:
+            kind, item_id = key
+            try:
+                if kind == "schedule":
+                    schedule = plan["schedules"][item_id]
+                    result = self.setSchedule(item_id, schedule["name"], schedule["timetable"])
+                else:
+                    circuit = plan["circuits"][item_id]
+                    result = self.setCircuitSchedules(
+                        item_id, circuit["day_schedules"], circuit.get("starting_day", 1)
+                    )
+            except Exception as e:
+                failed[key] = str(e)
+                continue
+            if not result:
+                failed[key] = "Controller refused the change"
+            elif self.lastWrite.sent:
+                written.append(key)
+            else:
+                skipped.append(key)
+
+        def read(key):
+            kind, item_id = key
+            if kind == "schedule":
+                schedule = self.getSchedule(item_id)
+                return _encodeSchedule(item_id, schedule["name"], schedule["timetable"])
+            circuit_schedules = self.getCircuitSchedules(item_id)
+            return _encodeCircuitSchedules(
+                item_id, circuit_schedules["day_schedules"], circuit_schedules["starting_day"]
+            )
+
+        def matches(key):
+            try:
+                return read(key) == payloads[key]
+            except Exception:
+                return False
+
+        if verify:
+            keys = [key for key in payloads if key not in failed]
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                mismatches = [key for key, ok in zip(keys, pool.map(self._withLogin(matches), keys)) if not ok]
+        return PlanReport(written, skipped, failed, mismatches, time.monotonic() - start)
+
+    @cached()
+    @authenticated
+    def getSummerMode(self):
+        """Return True if summer mode is currently activated."""
+        text = self._request("/loadSummerMode", "param=+")
+        return text == "0"
+
+    @authenticated
+    def setSummerMode(self, value):
+        """Enable or disable summer mode."""
+        payload = _encodeSummerMode(value)
+        if self._isNoop(payload, lambda: _encodeSummerMode(self.getSummerMode())):
+            return True
+        text = self._request("/saveSummerMode", {"summerMode": payload})
+        self._invalidate("getSummerMode")
+        return "true" in text
+
+    def _parseAssignments(self, text):
+        assignments = self._parse(parseAssignments, text)
+        # Truncated responses parse fine, there must be a digit per circuit
+        if len(assignments) < self.getNumCircuits():
+            raise _malformed(text)
+        return assignments
+
+    @cached(validator=_validAssignments)
+    @authenticated
+    def getSummerModeAssignments(self):
+        """Load circuit summer mode assignments, i.e. which circuits will be
+        affected by summer mode when it is turned on.
+        """
+        text = self._request("/letoLoadRooms", {"param": "+"})
+        return self._parseAssignments(text)
+
+    @authenticated
+    def setSummerModeAssignments(self, circuits, value):
+        """Assign or remove specified circuits to/from summer mode. Leave
+        other circuits as they are.
+        """
+        current = self.getSummerModeAssignments()
+        assignments = list(current)
+
+        for circuit_id in circuits:
+            assignments[circuit_id] = value
+
+        payload = _encodeAssignments(assignments)
+        if self._isNoop(payload, lambda: _encodeAssignments(current)):
+            return True
+        text = self._request("/letoSaveRooms", {"value": payload})
+        self._invalidate("getSummerModeAssignments")
+        return "true" in text
+
+    @cached(validator=_validLowMode)
+    @authenticated
+    def getLowMode(self):
+        """Get status of the LOW mode."""
+        text = self._request("/loadLows", {"param": "+"})
+        return self._parse(parseLowMode, text)
+
+    @authenticated
+    def setLowMode(
+        self, enabled, temperature=None, start_datetime=None, end_datetime=None
+    ):
+        """Enable or disable LOW mode. Temperature specified the desired
+        temperature for the LOW mode.
+
+        - If start_date is provided enable LOW mode indefiniitely.
+        - If also end_date is provided end the LOW mode at this specified date/time.
+        - If neither start_date nor end_date is provided disable LOW mode.
+
+        If LOW mode is already enabled and no start_date is provided, keep
+        its current start.
+        """
+        if temperature is None or (enabled and start_datetime is None):
+            low_mode = self.getLowMode()
+            if temperature is None:
+                temperature = low_mode["temperature"]
+            if start_datetime is None:
+                start_datetime = low_mode.get("start_date")
+
+        if start_datetime is None:
+            start_datetime = datetime.now()
+
+        payload = _encodeLowMode(enabled, temperature, start_datetime, end_datetime)
+
+        def current():
+            low_mode = self.getLowMode()
+            return _encodeLowMode(
+                low_mode["enabled"],
+                low_mode["temperature"],
+                low_mode.get("start_date"),
+                low_mode.get("end_date"),
+            )
+
+        if self._isNoop(payload, current):
+            return True
+        text = self._request("/lowSave", {"lowData": payload})
+        self._invalidate("getLowMode")
+        return "true" in text
+
+    @cached(validator=_validAssignments)
+    @authenticated
+    def getLowModeAssignments(self):
+        """Load circuit LOW mode assignments, i.e. which circuits will be
+        affected by LOW mode when it is turned on.
+        """
+        text = self._request("/lowLoadRooms", {"param": "+"})
+        return self._parseAssignments(text)
+
+    @authenticated
+    def setLowModeAssignments(self, circuits, value):
+        """Assign or remove specified circuits to/from LOW mode. Leave
+        other circuits as they are.
+        """
+        current = self.getLowModeAssignments()
+        assignments = list(current)
+
+        for circuit_id in circuits:
+            assignments[circuit_id] = value
+
+        payload = _encodeAssignments(assignments)
+        if self._isNoop(payload, lambda: _encodeAssignments(current)):
+            return True
+        text = self._request("/lowSaveRooms", {"value": payload})
+        self._invalidate("getLowModeAssignments")
+        return "true" in text
+
+    @cached(validator=_validCircuitSchedules)
+    @authenticated
+    def getCircuitSchedules(self, circuit_id):
+        """Load circuit schedule assignments, i.e. which schedule is assigned
+        to what day. It is possible to set different schedule for up 21
+        days.
+        """
+        data = {"roomID": "{:02d}".format(circuit_id)}
+        text = self._request("/roomSettings", data)
+        return self._parse(parseCircuitSchedules, text)
+
+    @authenticated
+    def setCircuitSchedules(self, circuit_id, day_schedules, starting_day=1):
+        """Assign circuits schedules. It is possible to have a different
+        schedule for up to 21 days.
+        """
+        payload = _encodeCircuitSchedules(circuit_id, day_schedules, starting_day)
+
+        def current():
+            circuit_schedules = self.getCircuitSchedules(circuit_id)
+            return _encodeCircuitSchedules(
+                circuit_id,
+                circuit_schedules["day_schedules"],
+                circuit_schedules["starting_day"],
+            )
+
+        if self._isNoop(payload, current):
+            return True
+        text = self._request("/saveAssignmentModes", {"roomSettings": payload})
+        self._invalidate("getCircuitSchedules")
+        return "true" in text
+
+    @cached()
+    @authenticated
+    def getHDO(self):
+        text = self._request("/loadHDO", "param=+")
+        return text == "1"
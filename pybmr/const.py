@@ -0,0 +1,50 @@
+"""Constants of the BMR HC64 API and defaults of the client. Importing
+this module is cheap, it has no dependencies.
+"""
+
+HTTP_DEFAULT_TIMEOUT = 10  # seconds
+HTTP_DEFAULT_MAX_RETRIES = 10
+CACHE_DEFAULT_MAXSIZE = 128
+CACHE_DEFAULT_TTL = 10
+CACHE_DEFAULT_MAX_STALE = 300  # seconds past TTL a stale value may be served
+VALIDATE_DEFAULT_RETRIES = 2
+TEMPERATURE_RANGE = (-30.0, 99.9)  # degrees, anything outside is a glitch
+
+NEGATIVE_CACHE_DEFAULT_BACKOFF = 60  # seconds, doubled on every failure
+NEGATIVE_CACHE_MAX_BACKOFF = 3600  # seconds
+
+# Optional features: the endpoints they use and the request probing them
+FEATURE_ENDPOINTS = {
+    "hdo": ("/loadHDO",),
+    "roller_shutters": (
+        "/numOfRollerShutters",
+        "/listOfRollerShutters",
+        "/wholeRollerShutter",
+        "/saveManualChange",
+    ),
+    "wind_sensor": ("/windSensorStatus",),
+}
+FEATURE_PROBES = {
+    "hdo": ("/loadHDO", "param=+"),
+    "roller_shutters": ("/numOfRollerShutters", {"param": "+"}),
+    "wind_sensor": ("/windSensorStatus", {"param": "+"}),
+}
+
+QUALITY_GOOD = "good"  # valid value loaded from the controller
+QUALITY_LAST_GOOD = "last_good"  # controller returned garbage, last valid value used
+QUALITY_INVALID = "invalid"  # controller returned garbage, no valid value known
+HTTP_DEFAULT_MAX_WORKERS = 4  # max. concurrent requests to a single controller
+MAX_ROLLER_SHUTTERS = 32
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+HTTP_FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded; charset=UTF-8"}
+CAPTURE_REDACTED_FIELDS = ("loginName", "passwd")
+# Events of `Bmr.addHook()`
+HOOK_EVENTS = (
+    "before_call",
+    "after_call",
+    "before_request",
+    "after_response",
+    "on_retry",
+    "on_parse",
+    "on_cache_hit",
+)
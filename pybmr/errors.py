@@ -0,0 +1,9 @@
+"""Exceptions raised by the client."""
+
+
+class MalformedDataError(Exception):
+    """The controller returned data that can't be parsed."""
+
+
+class UnsupportedFeatureError(Exception):
+    """The controller doesn't support the feature, or it failed recently."""
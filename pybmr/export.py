@@ -0,0 +1,135 @@
+"""Streaming export of circuit readings.
+
+`pollCircuits()` yields readings as they are polled and the writers consume
+any iterable of readings incrementally, so long collections run in constant
+memory:
+
+    writeCsv(pollCircuits([bmr], interval=60), open("history.csv", "w", newline=""))
+
+Parquet export needs the optional `pyarrow` package.
+"""
+
+import csv
+import itertools
+import logging
+import time
+
+EXPORT_FIELDS = (
+    "time",
+    "controller",
+    "id",
+    "name",
+    "enabled",
+    "temperature",
+    "target_temperature",
+    "user_offset",
+    "max_offset",
+    "heating",
+    "cooling",
+    "warning",
+    "low_mode",
+    "summer_mode",
+)
+EXPORT_DEFAULT_ROW_GROUP_SIZE = 65536  # rows
+EXPORT_DEFAULT_FLUSH_INTERVAL = 1.0  # seconds
+
+logger = logging.getLogger(__name__)
+
+
+def pollCircuits(controllers, interval, count=None):
+    """Poll all circuits of all `controllers` every `interval` seconds, `count`
+    times or forever, and yield a reading per circuit. A reading is the dict
+    returned by `Bmr.getCircuit()` with the poll `time` (seconds since the
+    epoch) and the unique ID of the `controller` added. Every poll of a
+    controller uses a single login.
+
+    Failures are logged and skipped, a controller or circuit that can't be
+    read is simply missing from that poll.
+    """
+    polls = itertools.count() if count is None else range(count)
+    for poll in polls:
+        started = time.monotonic()
+        if poll:
+            time.sleep(max(0, interval - (started - previous)))
+            started = time.monotonic()
+        previous = started
+        now = time.time()
+        for bmr in controllers:
+            # Yielded after the poll, not while the controller is logged in
+            readings = []
+            try:
+                with bmr.loggedIn():
+                    controller = bmr.getUniqueId()
+                    for circuit_id in range(bmr.getNumCircuits()):
+                        try:
+                            circuit = bmr.getCircuit(circuit_id)
+                        except Exception:
+                            logger.exception(
+                                "Failed to poll circuit %s of the BMR controller %s", circuit_id, bmr.baseUrl
+                            )
+                            continue
+                        readings.append(dict(circuit, time=now, controller=controller))
+            except Exception:
+                logger.exception("Failed to poll the BMR controller %s", bmr.baseUrl)
+            yield from readings
+
+
+def writeCsv(readings, fileobj, fields=EXPORT_FIELDS, flush_interval=EXPORT_DEFAULT_FLUSH_INTERVAL):
+    """Write readings to a CSV file as they come. The file is flushed with the
+    first row written `flush_interval` seconds after the previous flush and
+    at the end, so it is usable while the export is running. Return the
+    number of rows written.
+    """
+    writer = csv.DictWriter(fileobj, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    rows = 0
+    flushed = time.monotonic()
+    for reading in readings:
+        writer.writerow(reading)
+        rows += 1
+        if time.monotonic() - flushed >= flush_interval:
+            fileobj.flush()
+            flushed = time.monotonic()
+    fileobj.flush()
+    return rows
+
+
+def _parquetSchema(pa):
+    types = {
+        "time": pa.float64(),
+        "controller": pa.string(),
+        "id": pa.int16(),
+        "name": pa.string(),
+        "warning": pa.int16(),
+    }
+    for field in ("enabled", "heating", "cooling", "low_mode", "summer_mode"):
+        types[field] = pa.bool_()
+    return types
+
+
+def writeParquet(readings, path, fields=EXPORT_FIELDS, row_group_size=EXPORT_DEFAULT_ROW_GROUP_SIZE):
+    """Write readings to a Parquet file, buffering at most `row_group_size`
+    rows in memory. Every buffer is written as a row group. Return the
+    number of rows written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise Exception("Parquet export requires the pyarrow package")
+
+    types = _parquetSchema(pa)
+    schema = pa.schema([(field, types.get(field, pa.float64())) for field in fields])
+    converters = {
+        field: bool if schema.field(field).type == pa.bool_() else (lambda x: x) for field in fields
+    }
+    readings = iter(readings)
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter(lambda: list(itertools.islice(readings, row_group_size)), []):
+            columns = [
+                [None if r.get(field) is None else converters[field](r[field]) for r in chunk] for field in fields
+            ]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema), row_group_size=row_group_size)
+            rows += len(chunk)
+    return rows
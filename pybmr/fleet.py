@@ -0,0 +1,45 @@
+"""Operations on a fleet of BMR controllers.
+
+Every controller handles a single request at a time, so requests to one
+controller are kept (mostly) serial while the controllers are processed in
+parallel.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from pybmr import HTTP_DEFAULT_MAX_WORKERS, PlanReport, validateSchedulePlan
+
+FLEET_DEFAULT_MAX_WORKERS = 16  # controllers processed in parallel
+
+
+def applySchedulePlan(controllers, plan, verify=True, max_workers=FLEET_DEFAULT_MAX_WORKERS):
+    """Apply the schedule plan (see `pybmr.validateSchedulePlan()`) to all
+    `controllers` (`Bmr` instances), at most `max_workers` of them at the
+    same time. Return a list of `PlanReport`, one per controller.
+
+    The plan is validated before anything is written. A controller that
+    can't be talked to at all is reported with the error under the
+    ("controller", None) key.
+    """
+    validateSchedulePlan(plan)
+
+    def apply(bmr):
+        start = time.monotonic()
+        try:
+            return bmr.applySchedulePlan(plan, verify=verify)
+        except Exception as e:
+            return PlanReport([], [], {("controller", None): str(e)}, [], time.monotonic() - start)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(apply, controllers))
+
+
+def warmUp(controllers, max_workers=FLEET_DEFAULT_MAX_WORKERS, controller_max_workers=HTTP_DEFAULT_MAX_WORKERS):
+    """Warm up all `controllers` (see `pybmr.Bmr.warmUp()`), at most
+    `max_workers` of them at the same time, each using at most
+    `controller_max_workers` parallel requests. Return a list of
+    `WarmUpReport`, one per controller.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(lambda bmr: bmr.warmUp(controller_max_workers), controllers))
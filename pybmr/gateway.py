@@ -0,0 +1,255 @@
+"""Local JSON/HTTP gateway sharing a single BMR controller session between
+any number of clients.
+
+The gateway owns the `Bmr` client: a poller thread loads the controller state
+periodically and all writes go through a single serialized, rate-limited path,
+so the controller only ever sees one client. Clients read the state from
+memory:
+
+  GET  /state                       whole state as JSON
+  GET  /state/<section>[/<id>]      single section (or item of a list section)
+  GET  /events                      server-sent events with state changes
+  POST /summer_mode                 {"enabled": true}
+  POST /low_mode                    {"enabled": true, "temperature": 18}
+  POST /circuits/<id>/schedules     {"day_schedules": [1, 8], "starting_day": 1}
+  POST /shutters/<id>               {"pos": 100, "tilt": 100}
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+from threading import Condition, Event, Lock, Thread
+
+from pybmr import CACHE_DEFAULT_TTL, RateLimiter, UnsupportedFeatureError, jsonDefault
+
+GATEWAY_DEFAULT_PORT = 8064
+GATEWAY_DEFAULT_WRITE_RATE = 1  # writes per second
+GATEWAY_KEEPALIVE_INTERVAL = 15  # seconds
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps(value):
+    return json.dumps(value, default=jsonDefault, separators=(",", ":"))
+
+
+def loadState(bmr, shutters=False):
+    """Load the controller state, a dict of sections. Optional sections not
+    supported by the controller are left out. Set `shutters` to also load
+    the roller shutters. All getters share a single login.
+    """
+    with bmr.loggedIn():
+        state = {
+            "circuits": [bmr.getCircuit(i) for i in range(bmr.getNumCircuits())],
+            "summer_mode": bmr.getSummerMode(),
+            "low_mode": bmr.getLowMode(),
+        }
+        optional = {"hdo": bmr.getHDO}
+        if shutters:
+            optional["shutters"] = bmr.getAllRollerShutters
+        for section, getter in optional.items():
+            try:
+                state[section] = getter()
+            except UnsupportedFeatureError:
+                pass
+    return state
+
+
+class Gateway:
+    """Gateway serving the state of a single BMR controller over HTTP.
+
+    `poll_interval` is the number of seconds between state reloads and
+    `write_rate` the max. number of writes per second forwarded to the
+    controller. Set `shutters` to also poll the roller shutters.
+    """
+
+    def __init__(
+        self,
+        bmr,
+        host="127.0.0.1",
+        port=GATEWAY_DEFAULT_PORT,
+        poll_interval=CACHE_DEFAULT_TTL,
+        write_rate=GATEWAY_DEFAULT_WRITE_RATE,
+        shutters=False,
+    ):
+        self.bmr = bmr
+        self.poll_interval = poll_interval
+        self.shutters = shutters
+        self.version = 0
+        self._state = {}
+        self._changed = Condition()
+        self._device_lock = Lock()
+        self._write_limiter = RateLimiter(write_rate)
+        self._stop = Event()
+        self._threads = []
+        self._server = ThreadingHTTPServer((host, port), _GatewayHandler)
+        self._server.daemon_threads = True
+        self._server.gateway = self
+
+    @property
+    def address(self):
+        """Address (host, port) the gateway listens on."""
+        return self._server.server_address
+
+    @property
+    def state(self):
+        """Current state, a dict of sections. Don't modify it, it is
+        replaced (not updated) on every change.
+        """
+        return self._state
+
+    def poll(self):
+        """Load the controller state once. Return the dict of changed
+        sections.
+        """
+        with self._device_lock:
+            state = loadState(self.bmr, self.shutters)
+        changes = {k: v for k, v in state.items() if self._state.get(k) != v}
+        if changes:
+            with self._changed:
+                self._state = dict(self._state, **changes)
+                self.version += 1
+                self._changed.notify_all()
+        return changes
+
+    def write(self, method, *args):
+        """Call the `Bmr` setter `method` with `args` through the serialized,
+        rate-limited write path, then reload the state.
+        """
+        self._write_limiter.acquire()
+        with self._device_lock:
+            result = getattr(self.bmr, method)(*args)
+        # The write is done, a failed refresh is left to the poller
+        try:
+            self.poll()
+        except Exception:
+            logger.exception("Failed to load state of the BMR controller after %s", method)
+        return result
+
+    def waitForChange(self, version, timeout=None):
+        """Wait until the state version is newer than `version`. Return the
+        current version.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.version > version or self._stop.is_set(), timeout)
+            return self.version
+
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Failed to load state of the BMR controller")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """Start the poller and the HTTP server in background threads."""
+        self._stop.clear()
+        self._threads = [
+            Thread(target=self._poll_loop, name="bmr-gateway-poller", daemon=True),
+            Thread(target=self._server.serve_forever, name="bmr-gateway-server", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stop the poller and the HTTP server."""
+        self._stop.set()
+        with self._changed:
+            self._changed.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+        for thread in self._threads:
+            thread.join()
+
+
+class _GatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Setter name and function converting the JSON request to its arguments
+    WRITES = {
+        "summer_mode": ("setSummerMode", lambda ids, r: (r["enabled"],)),
+        "low_mode": ("setLowMode", lambda ids, r: (r["enabled"], r.get("temperature"))),
+        "circuits/schedules": (
+            "setCircuitSchedules",
+            lambda ids, r: (ids[0], r["day_schedules"], r.get("starting_day", 1)),
+        ),
+        "shutters": ("saveManualChange", lambda ids, r: (ids[0], r["pos"], r["tilt"])),
+    }
+
+    @property
+    def gateway(self):
+        return self.server.gateway
+
+    def _send(self, status, body, content_type="application/json"):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status, message):
+        self._send(status, _dumps({"error": message}))
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if parts == ["events"]:
+            return self._events()
+        if parts[0] != "state":
+            return self._error(404, "Not found")
+        value = self.gateway.state
+        try:
+            for part in parts[1:]:
+                value = value[int(part)] if isinstance(value, list) else value[part]
+        except (KeyError, IndexError, ValueError):
+            return self._error(404, "Not found")
+        self._send(200, _dumps(value))
+
+    def do_POST(self):
+        parts = self.path.strip("/").split("/")
+        ids = [int(p) for p in parts if p.isdigit()]
+        write = self.WRITES.get("/".join(p for p in parts if not p.isdigit()))
+        if write is None:
+            return self._error(404, "Not found")
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or "{}")
+            args = write[1](ids, request)
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            return self._error(400, "Invalid request: {}".format(e))
+        try:
+            result = self.gateway.write(write[0], *args)
+        except Exception as e:
+            return self._error(502, str(e))
+        self._send(200, _dumps({"result": result}))
+
+    def _events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        gateway = self.gateway
+        sent = {}
+        try:
+            while not gateway._stop.is_set():
+                version = gateway.version
+                state = gateway.state
+                # Sections are replaced on change, so identity tells what changed
+                changes = {k: v for k, v in state.items() if sent.get(k) is not v}
+                if changes:
+                    message = "id: {}\nevent: {}\ndata: {}\n\n".format(
+                        version, "state" if not sent else "change", _dumps(changes)
+                    )
+                    sent = state
+                else:
+                    message = ": keepalive\n\n"
+                self.wfile.write(message.encode("utf-8"))
+                self.wfile.flush()
+                gateway.waitForChange(version, GATEWAY_KEEPALIVE_INTERVAL)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
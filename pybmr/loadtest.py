@@ -0,0 +1,452 @@
+"""Load and soak testing of `Bmr` clients against a stand-in HC64 controller.
+
+`FakeController` is a local HTTP server emulating the BMR HC64 API with
+in-memory state and configurable latency and error rate. `runLoadTest()`
+runs a workload profile with many concurrent consumers sharing a few `Bmr`
+clients and reports throughput, latency percentiles per `Bmr` method, error
+and retry rates and memory growth (resident set size, or Python allocations
+with `trace_memory`, which slows down the clients) over time.
+
+    python -m pybmr.loadtest --profile mixed --consumers 100 --clients 4 --duration 3600
+"""
+
+import argparse
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import random
+import sys
+from threading import Event, Lock, Thread
+import time
+import tracemalloc
+from typing import NamedTuple
+from urllib.parse import parse_qsl
+
+from pybmr import HTTP_DEFAULT_MAX_RETRIES, HTTP_DEFAULT_TIMEOUT, Bmr, RequestsTransport, Transport
+
+LOADTEST_DEFAULT_CIRCUITS = 16
+LOADTEST_DEFAULT_SHUTTERS = 12
+LOADTEST_RESERVOIR_SIZE = 10000  # latencies kept per method
+LOADTEST_DEFAULT_SAMPLE_INTERVAL = 10  # seconds between memory samples
+
+
+class FakeController:
+    """Local HTTP server emulating a BMR HC64 controller. Every request takes
+    `latency` seconds and fails with HTTP 500 with probability `error_rate`.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        circuits=LOADTEST_DEFAULT_CIRCUITS,
+        shutters=LOADTEST_DEFAULT_SHUTTERS,
+        latency=0.0,
+        error_rate=0.0,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = Lock()
+        self._random = random.Random(0)
+        self.circuits = [
+            {"name": "Circuit {}".format(i), "temperature": 21.0, "heating": 0} for i in range(circuits)
+        ]
+        self.circuit_schedules = ["01" + "{:02d}".format(i % 32) + "-1" * 20 for i in range(circuits)]
+        self.schedules = ["{:13.13}00:00021".format("Schedule {}".format(i)) for i in range(32)]
+        self.shutters = [["Shutter {}".format(i), 0, 0] for i in range(shutters)]
+        self.summer_mode = "1"
+        self.low_mode = "018" + " " * 30
+        self.summer_assignments = "0" * circuits
+        self.low_assignments = "0" * circuits
+        self._server = ThreadingHTTPServer((host, port), _FakeControllerHandler)
+        self._server.daemon_threads = True
+        self._server.controller = self
+        self._thread = None
+
+    @property
+    def url(self):
+        return "http://{}:{}/".format(*self._server.server_address)
+
+    def start(self):
+        self._thread = Thread(target=self._server.serve_forever, name="bmr-fake-controller", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def _circuit(self, circuit_id):
+        circuit = self.circuits[circuit_id]
+        # Random walk of the temperature, heating below 21 degrees
+        circuit["temperature"] += self._random.choice((-0.1, 0, 0.1))
+        circuit["heating"] = int(circuit["temperature"] < 21)
+        return "1{:13.13}{:05.1f}+21{:05.1f}000.005.0{}000000{}0".format(
+            circuit["name"], circuit["temperature"], 21.0, circuit["heating"], "0" if self.summer_mode == "1" else "1"
+        )
+
+    def handle(self, path, data):
+        """Return (status, body) of the response to a request."""
+        with self._lock:
+            self.requests += 1
+            if self._random.random() < self.error_rate:
+                return 500, "Internal error"
+            if path == "/menu.html":
+                return 200, "<html></html>"
+            if path == "/numOfRooms":
+                return 200, str(len(self.circuits))
+            if path == "/listOfRooms":
+                return 200, "".join("{:13.13}".format(c["name"]) for c in self.circuits)
+            if path == "/wholeRoom":
+                return 200, self._circuit(int(data["param"]))
+            if path == "/listOfModes":
+                return 200, "".join(s[:13] for s in self.schedules)
+            if path == "/loadMode":
+                return 200, self.schedules[int(data["modeID"])]
+            if path == "/saveMode":
+                self.schedules[int(data["modeSettings"][:2])] = data["modeSettings"][2:]
+            elif path == "/deleteMode":
+                self.schedules[int(data["modeID"])] = "{:13.13}".format("")
+            elif path == "/loadSummerMode":
+                return 200, self.summer_mode
+            elif path == "/saveSummerMode":
+                self.summer_mode = data["summerMode"]
+            elif path == "/letoLoadRooms":
+                return 200, self.summer_assignments
+            elif path == "/letoSaveRooms":
+                self.summer_assignments = data["value"]
+            elif path == "/loadLows":
+                return 200, self.low_mode
+            elif path == "/lowSave":
+                self.low_mode = data["lowData"]
+            elif path == "/lowLoadRooms":
+                return 200, self.low_assignments
+            elif path == "/lowSaveRooms":
+                self.low_assignments = data["value"]
+            elif path == "/roomSettings":
+                settings = self.circuit_schedules[int(data["roomID"])]
+                # Mark the first day as the active one
+                return 200, settings[:2] + "{:02d}".format(int(settings[2:4]) | 0b100000) + settings[4:]
+            elif path == "/saveAssignmentModes":
+                self.circuit_schedules[int(data["roomSettings"][:2])] = data["roomSettings"][2:]
+            elif path == "/loadHDO":
+                return 200, "0"
+            elif path == "/numOfRollerShutters":
+                return 200, str(len(self.shutters))
+            elif path == "/listOfRollerShutters":
+                return 200, "".join("{:13.13}".format(s[0]) for s in self.shutters)
+            elif path == "/windSensorStatus":
+                return 200, "0" * 52
+            elif path == "/wholeRollerShutter":
+                name, pos, tilt = self.shutters[int(data["rollerShutter"])]
+                return 200, "1{:13.13}{:01d}{:02d}{}".format(name, pos, tilt, "0" * 16)
+            elif path == "/saveManualChange":
+                change = data["manualChange"]
+                self.shutters[int(change[:2])][1:] = [int(change[2]), int(change[3:5])]
+            else:
+                return 404, "Not found"
+            return 200, "true"
+
+
+class _FakeControllerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        controller = self.server.controller
+        if controller.latency:
+            time.sleep(controller.latency)
+        status, text = controller.handle(self.path, dict(parse_qsl(body)))
+        payload = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class _StatsTransport(Transport):
+    """Transport wrapper counting requests and retries."""
+
+    def __init__(self, transport, stats):
+        self._transport = transport
+        self._stats = stats
+
+    def post(self, path, data):
+        response = self._transport.post(path, data)
+        self._stats.record("requests", response.retries)
+        return response
+
+    def probe(self, path, data):
+        response = self._transport.probe(path, data)
+        self._stats.record("requests", response.retries)
+        return response
+
+    def close(self):
+        self._transport.close()
+
+
+class _Stats:
+    """Thread-safe collection of latencies (a bounded random sample per
+    method), errors and request counts.
+    """
+
+    def __init__(self, seed=0):
+        self.latencies = defaultdict(list)
+        self.calls = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.requests = 0
+        self.retries = 0
+        self._random = random.Random(seed)
+        self._lock = Lock()
+
+    def record(self, kind, value):
+        with self._lock:
+            if kind == "requests":
+                self.requests += 1
+                self.retries += value
+                return
+            method, latency, failed = value
+            self.calls[method] += 1
+            if failed:
+                self.errors[method] += 1
+            samples = self.latencies[method]
+            if len(samples) < LOADTEST_RESERVOIR_SIZE:
+                samples.append(latency)
+            else:
+                idx = self._random.randrange(self.calls[method])
+                if idx < LOADTEST_RESERVOIR_SIZE:
+                    samples[idx] = latency
+
+
+def _dashboard(bmr, rng):
+    return rng.choice(
+        [
+            ("getCircuit", lambda: bmr.getCircuit(rng.randrange(bmr.getNumCircuits()))),
+            ("getCircuit", lambda: bmr.getCircuit(rng.randrange(bmr.getNumCircuits()))),
+            ("getCircuit", lambda: bmr.getCircuit(rng.randrange(bmr.getNumCircuits()))),
+            ("getSummerMode", bmr.getSummerMode),
+            ("getLowMode", bmr.getLowMode),
+            ("getSchedules", bmr.getSchedules),
+            ("getCircuitSchedules", lambda: bmr.getCircuitSchedules(rng.randrange(bmr.getNumCircuits()))),
+            ("getAllRollerShutters", bmr.getAllRollerShutters),
+        ]
+    )
+
+
+def _writes(bmr, rng):
+    return rng.choice(
+        [
+            ("setSummerMode", lambda: bmr.setSummerMode(rng.random() < 0.5)),
+            ("setLowModeAssignments", lambda: bmr.setLowModeAssignments([rng.randrange(4)], rng.random() < 0.5)),
+            ("setCircuitSchedules", lambda: bmr.setCircuitSchedules(rng.randrange(4), [rng.randrange(32)])),
+            ("saveManualChange", lambda: bmr.saveManualChange(rng.randrange(4), rng.randrange(101), 100)),
+        ]
+    )
+
+
+def _mixed(bmr, rng):
+    return _writes(bmr, rng) if rng.random() < 0.1 else _dashboard(bmr, rng)
+
+
+# Workload profiles: function(bmr, rng) returning (method name, operation)
+PROFILES = {"dashboard": _dashboard, "writes": _writes, "mixed": _mixed}
+
+
+class LoadTestReport(NamedTuple):
+    duration: float  # seconds
+    calls: int
+    throughput: float  # calls per second
+    methods: dict  # method -> {"calls", "errors", "p50", "p95", "p99"} (latencies in seconds)
+    requests: int  # HTTP requests sent
+    retries: int  # HTTP retries
+    memory: list  # (seconds since start, bytes resident or allocated, see `runLoadTest()`)
+
+    @property
+    def errorRate(self):
+        return sum(m["errors"] for m in self.methods.values()) / self.calls if self.calls else 0.0
+
+    @property
+    def retryRate(self):
+        return self.retries / self.requests if self.requests else 0.0
+
+    @property
+    def memoryGrowth(self):
+        """Memory growth in bytes since the first memory sample."""
+        return self.memory[-1][1] - self.memory[0][1] if self.memory else 0
+
+    def format(self):
+        lines = [
+            "{} calls in {:.1f} s ({:.1f} calls/s), {} requests, error rate {:.2%}, retry rate {:.2%}, "
+            "memory growth {} kB".format(
+                self.calls,
+                self.duration,
+                self.throughput,
+                self.requests,
+                self.errorRate,
+                self.retryRate,
+                self.memoryGrowth // 1024,
+            ),
+            "{:<24}{:>8}{:>8}{:>10}{:>10}{:>10}".format("method", "calls", "errors", "p50 ms", "p95 ms", "p99 ms"),
+        ]
+        for method, m in sorted(self.methods.items()):
+            lines.append(
+                "{:<24}{:>8}{:>8}{:>10.1f}{:>10.1f}{:>10.1f}".format(
+                    method, m["calls"], m["errors"], m["p50"] * 1000, m["p95"] * 1000, m["p99"] * 1000
+                )
+            )
+        return "\n".join(lines)
+
+
+def _percentile(values, q):
+    """Percentile `q` (0-100) of sorted `values`, nearest rank."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values) + 0.5)) - 1))]
+
+
+def _rss():
+    """Resident set size of this process in bytes. Where the current one is
+    not available the peak one is returned, 0 on Windows.
+    """
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # Kilobytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def _client(kwargs, stats):
+    """Create `Bmr` from its keyword arguments `kwargs` with its transport
+    wrapped in `_StatsTransport`.
+    """
+    kwargs = dict(kwargs)
+    transport = kwargs.pop("transport", None) or RequestsTransport(
+        kwargs["base_url"],
+        timeout=kwargs.pop("timeout", HTTP_DEFAULT_TIMEOUT),
+        max_retries=kwargs.pop("max_retries", HTTP_DEFAULT_MAX_RETRIES),
+    )
+    return Bmr(transport=_StatsTransport(transport, stats), **kwargs)
+
+
+def runLoadTest(
+    clients,
+    profile="mixed",
+    consumers=10,
+    duration=10.0,
+    sample_interval=LOADTEST_DEFAULT_SAMPLE_INTERVAL,
+    seed=0,
+    trace_memory=False,
+):
+    """Run the workload `profile` (a name from `PROFILES` or a function) with
+    `consumers` threads sharing the `Bmr` clients round-robin for `duration`
+    seconds. Return `LoadTestReport`.
+
+    `clients` is a list of dicts of `Bmr` keyword arguments, e.g.
+    {"base_url": ..., "user": ..., "password": ...}; the clients are created
+    for the test and closed at its end. Memory is sampled as the resident
+    set size of the process, set `trace_memory` to sample the memory
+    allocated by Python with `tracemalloc` instead. Tracing every allocation
+    slows down the clients, so the latencies and throughput are skewed.
+    """
+    profile = PROFILES.get(profile, profile)
+    stats = _Stats(seed)
+    clients = [_client(kwargs, stats) for kwargs in clients]
+    stop = Event()
+
+    def consume(idx):
+        bmr = clients[idx % len(clients)]
+        rng = random.Random(seed + idx)
+        while not stop.is_set():
+            method, operation = profile(bmr, rng)
+            start = time.perf_counter()
+            failed = False
+            try:
+                operation()
+            except Exception:
+                failed = True
+            stats.record("call", (method, time.perf_counter() - start, failed))
+
+    tracing = trace_memory and tracemalloc.is_tracing()
+    if trace_memory and not tracing:
+        tracemalloc.start()
+    memory = []
+    start = time.monotonic()
+    threads = [Thread(target=consume, args=(idx,), daemon=True) for idx in range(consumers)]
+    try:
+        for thread in threads:
+            thread.start()
+        while True:
+            elapsed = time.monotonic() - start
+            memory.append((elapsed, tracemalloc.get_traced_memory()[0] if trace_memory else _rss()))
+            if elapsed >= duration:
+                break
+            time.sleep(min(sample_interval, duration - elapsed))
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        stop.set()
+        if trace_memory and not tracing:
+            tracemalloc.stop()
+        for bmr in clients:
+            bmr.close()
+    elapsed = time.monotonic() - start
+
+    methods = {}
+    for method, latencies in stats.latencies.items():
+        latencies = sorted(latencies)
+        methods[method] = {
+            "calls": stats.calls[method],
+            "errors": stats.errors[method],
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+        }
+    calls = sum(stats.calls.values())
+    return LoadTestReport(elapsed, calls, calls / elapsed, methods, stats.requests, stats.retries, memory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test BMR clients against a stand-in HC64 controller")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="mixed")
+    parser.add_argument("--consumers", type=int, default=10)
+    parser.add_argument("--clients", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="latency of the controller in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of HTTP 500 responses")
+    parser.add_argument("--sample-interval", type=float, default=LOADTEST_DEFAULT_SAMPLE_INTERVAL)
+    parser.add_argument(
+        "--trace-memory", action="store_true", help="sample Python allocations instead of the resident set size"
+    )
+    args = parser.parse_args(argv)
+
+    controller = FakeController(latency=args.latency, error_rate=args.error_rate).start()
+    try:
+        clients = [{"base_url": controller.url, "user": "admin", "password": "admin"}] * args.clients
+        report = runLoadTest(
+            clients,
+            args.profile,
+            consumers=args.consumers,
+            duration=args.duration,
+            sample_interval=args.sample_interval,
+            trace_memory=args.trace_memory,
+        )
+    finally:
+        controller.stop()
+    print(report.format())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Change-only MQTT publisher of the state of a BMR controller.
+
+The state is mapped to a topic tree of retained topics, one per value:
+
+  <prefix>/circuits/<id>/<field>          e.g. bmr/circuits/0/temperature
+  <prefix>/summer_mode
+  <prefix>/low_mode/<field>
+  <prefix>/hdo
+  <prefix>/shutters/<id>/<field>
+
+Payloads are JSON, e.g. `"F01 Byt"` or `17.5`. Every poll cycle loads the
+whole state and publishes only the values that changed since the previous
+cycle, and clears the topics of removed values with an empty payload.
+MQTT has no multi-message publish, so the changes of a cycle are published
+back-to-back under the device lock; the MQTT client queues them and its
+network loop writes them out together. Commands are accepted on:
+
+  <prefix>/summer_mode/set                true
+  <prefix>/low_mode/set                   {"enabled": true, "temperature": 18}
+  <prefix>/shutters/<id>/set              {"pos": 100, "tilt": 100}
+
+The MQTT client is any object with the `publish()`, `subscribe()` and
+`message_callback_add()` methods of a paho-mqtt `Client`. `LocalBroker`
+provides in-process clients for testing without an MQTT broker.
+"""
+
+from collections.abc import Mapping
+import json
+import logging
+from queue import Queue
+from threading import Event, Lock, Thread
+from typing import NamedTuple
+
+from pybmr import CACHE_DEFAULT_TTL, RateLimiter, jsonDefault
+from pybmr.gateway import GATEWAY_DEFAULT_WRITE_RATE, loadState
+
+MQTT_DEFAULT_PREFIX = "bmr"
+
+logger = logging.getLogger(__name__)
+
+
+def topicMatches(pattern, topic):
+    """Return True if `topic` matches the subscription `pattern` with the
+    MQTT wildcards "+" (single level) and "#" (all remaining levels).
+    """
+    pattern, topic = pattern.split("/"), topic.split("/")
+    for idx, part in enumerate(pattern):
+        if part == "#":
+            return True
+        if idx >= len(topic) or part not in ("+", topic[idx]):
+            return False
+    return len(pattern) == len(topic)
+
+
+def _payload(value):
+    return json.dumps(value, default=jsonDefault)
+
+
+def _flatten(topic, value):
+    """Yield (topic, payload) of all scalar values in `value`."""
+    if hasattr(value, "_asdict"):
+        value = value._asdict()
+    if isinstance(value, Mapping):
+        for key, item in value.items():
+            yield from _flatten("{}/{}".format(topic, key), item)
+    elif isinstance(value, list):
+        for idx, item in enumerate(value):
+            yield from _flatten("{}/{}".format(topic, idx), item)
+    else:
+        yield topic, _payload(value)
+
+
+class MqttPublisher:
+    """Publisher of the state of a single BMR controller to MQTT.
+
+    `poll_interval` is the number of seconds between poll cycles and
+    `write_rate` the max. number of commands per second forwarded to the
+    controller. Set `shutters` to also publish the roller shutters.
+    """
+
+    # Setter name and function converting the command payload to its arguments
+    COMMANDS = {
+        "summer_mode/set": ("setSummerMode", lambda ids, r: (bool(r),)),
+        "low_mode/set": (
+            "setLowMode",
+            lambda ids, r: (r, None) if isinstance(r, bool) else (r["enabled"], r.get("temperature")),
+        ),
+        "shutters/set": ("saveManualChange", lambda ids, r: (ids[0], r["pos"], r["tilt"])),
+    }
+
+    def __init__(
+        self,
+        bmr,
+        client,
+        prefix=MQTT_DEFAULT_PREFIX,
+        poll_interval=CACHE_DEFAULT_TTL,
+        write_rate=GATEWAY_DEFAULT_WRITE_RATE,
+        shutters=False,
+        qos=0,
+    ):
+        self.bmr = bmr
+        self.client = client
+        self.prefix = prefix
+        self.poll_interval = poll_interval
+        self.shutters = shutters
+        self.qos = qos
+        self._published = {}
+        self._device_lock = Lock()
+        self._write_limiter = RateLimiter(write_rate)
+        self._commands = Queue()
+        self._stop = Event()
+        self._threads = []
+        for topic in (prefix + "/+/set", prefix + "/shutters/+/set"):
+            client.message_callback_add(topic, self._onMessage)
+            client.subscribe(topic, qos)
+
+    def poll(self):
+        """Run one poll cycle: load the controller state and publish the
+        changed values. Return the dict of published topics and payloads
+        (None for cleared topics).
+        """
+        with self._device_lock:
+            state = loadState(self.bmr, self.shutters)
+            values = {}
+            for section, value in state.items():
+                values.update(_flatten("{}/{}".format(self.prefix, section), value))
+            changes = {t: p for t, p in values.items() if self._published.get(t) != p}
+            changes.update((t, None) for t in self._published if t not in values)
+            for topic, payload in changes.items():
+                self.client.publish(topic, "" if payload is None else payload, self.qos, retain=True)
+            self._published = values
+        return changes
+
+    def _onMessage(self, client, userdata, message):
+        parts = message.topic[len(self.prefix) + 1 :].split("/")
+        ids = [int(p) for p in parts if p.isdigit()]
+        command = self.COMMANDS.get("/".join(p for p in parts if not p.isdigit()))
+        try:
+            args = command[1](ids, json.loads(message.payload))
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            logger.warning("Invalid command on %s: %s", message.topic, e)
+            return
+        # Don't block the MQTT client thread, the writer thread sends it
+        self._commands.put((command[0], args))
+
+    def write(self, method, *args):
+        """Call the `Bmr` setter `method` with `args` through the serialized,
+        rate-limited write path, then run a poll cycle. A failure of the
+        poll cycle is logged, it doesn't affect the result of the write.
+        """
+        self._write_limiter.acquire()
+        with self._device_lock:
+            result = getattr(self.bmr, method)(*args)
+        try:
+            self.poll()
+        except Exception:
+            logger.exception("Failed to load state of the BMR controller after %s", method)
+        return result
+
+    def _write_loop(self):
+        while True:
+            command = self._commands.get()
+            if command is None:
+                return
+            try:
+                self.write(command[0], *command[1])
+            except Exception:
+                logger.exception("Failed to send command %s to the BMR controller", command[0])
+
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Failed to load state of the BMR controller")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """Start the poller and the command writer in background threads."""
+        self._stop.clear()
+        self._threads = [
+            Thread(target=self._poll_loop, name="bmr-mqtt-poller", daemon=True),
+            Thread(target=self._write_loop, name="bmr-mqtt-writer", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stop the poller and the command writer."""
+        self._stop.set()
+        self._commands.put(None)
+        for thread in self._threads:
+            thread.join()
+
+
+class Message(NamedTuple):
+    topic: str
+    payload: bytes
+    qos: int
+    retain: bool
+
+
+class LocalBroker:
+    """In-process MQTT broker keeping retained messages. Its clients
+    implement the subset of the paho-mqtt `Client` API used by
+    `MqttPublisher`.
+    """
+
+    def __init__(self):
+        self.retained = {}
+        self._clients = []
+        self._lock = Lock()
+
+    def client(self):
+        client = LocalClient(self)
+        with self._lock:
+            self._clients.append(client)
+        return client
+
+    def publish(self, message):
+        with self._lock:
+            if message.retain:
+                if message.payload:
+                    self.retained[message.topic] = message
+                else:
+                    self.retained.pop(message.topic, None)
+            clients = list(self._clients)
+        for client in clients:
+            client._deliver(message._replace(retain=False))
+
+
+class LocalClient:
+    """Client of `LocalBroker`. Messages are delivered synchronously in the
+    thread of the publisher.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.on_message = None
+        self._subscriptions = []
+        self._callbacks = []
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        self.broker.publish(Message(topic, payload or b"", qos, retain))
+
+    def subscribe(self, topic, qos=0):
+        self._subscriptions.append(topic)
+        with self.broker._lock:
+            retained = [m for t, m in self.broker.retained.items() if topicMatches(topic, t)]
+        for message in retained:
+            self._deliver(message)
+
+    def message_callback_add(self, sub, callback):
+        self._callbacks.append((sub, callback))
+
+    def _deliver(self, message):
+        if not any(topicMatches(s, message.topic) for s in self._subscriptions):
+            return
+        callbacks = [c for s, c in self._callbacks if topicMatches(s, message.topic)]
+        if not callbacks and self.on_message:
+            callbacks = [self.on_message]
+        for callback in callbacks:
+            callback(self, None, message)
@@ -0,0 +1,377 @@
+"""Parsers and encoders of the data exchanged with the BMR controller, and
+validators of the parsed values. They don't talk to the controller.
+"""
+
+from collections.abc import Mapping
+from datetime import datetime
+import re
+from types import MappingProxyType
+
+from pybmr.const import TEMPERATURE_RANGE
+from pybmr.errors import MalformedDataError
+
+
+def _malformed(text):
+    return MalformedDataError(
+        "Server returned malformed data: {}. Try again later".format(text)
+    )
+
+
+def freeze(value):
+    """Return an immutable copy of a parsed value: dicts are turned into
+    read-only `MappingProxyType` and lists into tuples, recursively.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def jsonDefault(value):
+    """`default` function of `json.dumps()` encoding parsed values: datetimes
+    as ISO 8601 strings, read-only mappings (see `freeze()`) and named tuples
+    as objects.
+    """
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Mapping):
+        return dict(value)
+    if hasattr(value, "_asdict"):
+        return value._asdict()
+    raise TypeError("Object of type {} is not JSON serializable".format(type(value).__name__))
+
+
+def parseNames(text):
+    """Parse a list of names, 13 characters each, e.g. of circuits."""
+    # Example: F01 Byt      F02 Pokoj    F03 Loznice  F04 Koupelna F05 Det pokojF06 Chodba   F07 Kuchyne  F08 Obyvak   R01 Byt      R02 Pokoj    R03 Loznice  R04 Koupelna R05 Det pokojR06 Chodba   R07 Kuchyne  R08 Obyvak  # noqa
+    return [
+        text[i : i + 13].strip() for i in range(0, len(text), 13)
+    ]
+
+
+def parseCircuit(circuit_id, text):
+    """Parse circuit status, see `Bmr.getCircuit()`."""
+    match = re.match(
+        r"""
+            (?P<enabled>.{1})                  # Whether the circuit is enabled
+            (?P<name>.{13})                    # Name of the circuit
+            (?P<temperature>.{5})              # Current temperature
+            (?P<target_temperature_str>.{3})   # Target temperature (string)
+            (?P<target_temperature>.{5})       # Target temperature (float)
+            (?P<user_offset>.{5})              # Current temperature offset set by user
+            (?P<max_offset>.{4})               # Max temperature offset
+            (?P<heating>.{1})                  # Whether the circuit is currently heating
+            (?P<window_heating>.{1})
+            (?P<card>.{1})
+            (?P<warning>.{3})                  # Warning code
+            (?P<low_mode>.{1})                 # Whether the circuit is assigned to low mode and low mode is active
+            (?P<summer_mode>.{1})              # Whether the circuit is assigned to summer mode and summer mode
+                                               # is active
+            (?P<cooling>.{1})                  # Whether the circuit is cooling (only water-based circuits)
+            """,
+        text,
+        re.VERBOSE,
+    )
+    if not match:
+        raise _malformed(text)
+    room_status = match.groupdict()
+    if room_status["enabled"] not in ("0", "1"):
+        raise _malformed(text)
+
+    # Sometimes some of the values are malformed, i.e. "00\x00\x00\x00" or "-1-1-"
+    result = {
+        "id": circuit_id,
+        "enabled": room_status["enabled"] == "1",
+        "name": room_status["name"].rstrip(),
+        "temperature": None,
+        "target_temperature": None,
+        "user_offset": None,
+        "max_offset": None,
+        "heating": False,
+        "warning": 0,
+        "cooling": False,
+        "low_mode": False,
+        "summer_mode": False,
+    }
+
+    for key in (
+        "temperature",
+        "heating",
+        "cooling",
+        "warning",
+        "low_mode",
+        "summer_mode",
+        "user_offset",
+        "max_offset",
+    ):
+        try:
+            result[key] = float(room_status[key])
+        except ValueError:
+            pass
+
+    try:
+        # If summer mode is turned on (which means the system is powered
+        # down) we will return target temperature as `None`, not 0 degrees
+        #
+        # Also ignore and set it to None if target temperature is 0
+        # degrees. That is most likely a nonsense reported when the
+        # heating controller is reloading configuration.
+        if not bool(int(room_status["summer_mode"])):
+            result["target_temperature"] = (
+                float(room_status["target_temperature"]) or None
+            )
+        else:
+            result["target_temperature"] = None
+    except ValueError:
+        pass
+
+    return result
+
+
+def parseSchedules(text):
+    """Parse the list of schedule names."""
+    return [x.rstrip() for x in re.findall(r".{13}", text)]
+
+
+def parseSchedule(schedule_id, text):
+    """Parse schedule settings, see `Bmr.getSchedule()`."""
+    # Example: 1 Byt        00:0002106:0002112:0002121:00021
+    match = re.match(
+        r"""
+            (?P<name>.{13})                          # schedule name
+            (?P<timetable>(\d{2}:\d{2}\d{3}){1,8})?  # time and target temperature
+        """,
+        text,
+        re.VERBOSE,
+    )
+    if not match:
+        raise _malformed(text)
+    schedule = match.groupdict()
+    timetable = None
+    if schedule["timetable"]:
+        timetable = [
+            {"time": x[0], "temperature": int(x[1])}
+            for x in re.findall(r"(\d{2}:\d{2})(\d{3})", schedule["timetable"])
+        ]
+
+    return {
+        "id": schedule_id,
+        "name": schedule["name"].rstrip(),
+        "timetable": timetable,
+    }
+
+
+def parseAssignments(text):
+    """Parse summer or LOW mode assignments, one digit per circuit."""
+    try:
+        return [bool(int(x)) for x in list(text)]
+    except ValueError:
+        raise _malformed(text)
+
+
+def parseLowMode(text):
+    """Parse status of the LOW mode, see `Bmr.getLowMode()`."""
+    # The response is formatted as "<temperature><start_datetime><end_datetime>", let's parse it
+    match = re.match(
+        r"""
+        (?P<temperature>\d{3})
+        (?P<start_datetime>\d{4}-\d{2}-\d{2}\d{2}:\d{2})?
+        (?P<end_datetime>\d{4}-\d{2}-\d{2}\d{2}:\d{2})?
+        """,
+        text,
+        re.VERBOSE,
+    )
+    if not match:
+        raise _malformed(text)
+    low_mode = match.groupdict()
+    result = {
+        "enabled": low_mode["start_datetime"] is not None,
+        "temperature": int(low_mode["temperature"]),
+    }
+    if low_mode["start_datetime"]:
+        result["start_date"] = datetime.strptime(
+            low_mode["start_datetime"], "%Y-%m-%d%H:%M"
+        )
+    if low_mode["end_datetime"]:
+        result["end_date"] = datetime.strptime(
+            low_mode["end_datetime"], "%Y-%m-%d%H:%M"
+        )
+    return result
+
+
+def parseCircuitSchedules(text):
+    """Parse circuit schedule assignments, see `Bmr.getCircuitSchedules()`."""
+    # Example: 0140-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1
+    match = re.match(
+        r"""
+            (?P<starting_day>\d{2})        # Which schedule should be the
+                                           # first to start with. Can be either
+                                           # "01", "08" or "15". Note that
+                                           # there can't be any unconfigured
+                                           # gaps (missing schedules) in any
+                                           # days between day 1 and the
+                                           # starting day.
+            (?P<day_schedules>([-\d]{2}){21})  # schedule IDs + indicator of the
+                                           # currently active schedule
+            """,
+        text,
+        re.VERBOSE,
+    )
+    if not match:
+        raise _malformed(text)
+    circuit_schedules = match.groupdict()
+    result = {
+        "starting_day": int(circuit_schedules["starting_day"]),
+        "current_day": None,
+        "day_schedules": [],
+    }
+    for idx, schedule_id in enumerate(
+        re.findall(r"[-\d]{2}", circuit_schedules["day_schedules"])
+    ):
+        schedule_id = int(schedule_id)
+        if schedule_id == -1:
+            # The list of schedules must be continuous, there aren't
+            # allowed any "gaps". So this is the last entry, following items
+            # have to be are "-1" as well.
+            break
+        else:
+            result["day_schedules"].append(
+                schedule_id & 0b00011111
+            )  # schedule ID is in the lower 5 bits
+            if (
+                schedule_id & 0b00100000 == 0b00100000
+            ):  # 6th rightmost bit is indicator of currently active schedule
+                result["current_day"] = idx + 1
+    return result
+
+
+def _inRange(value, low=TEMPERATURE_RANGE[0], high=TEMPERATURE_RANGE[1]):
+    return value is not None and low <= value <= high
+
+
+def _validCircuit(circuit):
+    return (
+        _inRange(circuit["temperature"])
+        and (circuit["target_temperature"] is None or _inRange(circuit["target_temperature"]))
+        and circuit["user_offset"] is not None
+        and _inRange(circuit["max_offset"], 0)
+        and all(circuit[key] in (0, 1) for key in ("heating", "cooling", "low_mode", "summer_mode"))
+    )
+
+
+def _validSchedule(schedule):
+    if schedule["timetable"] is None:
+        return True
+    return schedule["timetable"][0]["time"] == "00:00" and all(
+        int(entry["time"][:2]) < 24 and int(entry["time"][3:]) < 60 and _inRange(entry["temperature"])
+        for entry in schedule["timetable"]
+    )
+
+
+def _validCircuitSchedules(circuit_schedules):
+    return circuit_schedules["starting_day"] in (1, 8, 15) and (
+        circuit_schedules["current_day"] is None
+        or circuit_schedules["current_day"] <= len(circuit_schedules["day_schedules"])
+    )
+
+
+def _validLowMode(low_mode):
+    return _inRange(low_mode["temperature"])
+
+
+def _validAssignments(assignments):
+    return len(assignments) > 0
+
+
+def _encodeSchedule(schedule_id, name, timetable):
+    """Encode schedule settings the way `setSchedule()` sends them."""
+    if not timetable or timetable[0]["time"] != "00:00":
+        raise Exception("First timetable entry must be for time 00:00")
+    return "{:02d}{:13.13}{}".format(
+        schedule_id,
+        name[:13],
+        "".join(
+            [
+                "{}{:03d}".format(item["time"], int(item["temperature"]))
+                for item in timetable
+            ]
+        ),
+    )
+
+
+def _encodeSummerMode(value):
+    return "0" if value else "1"
+
+
+def _encodeAssignments(assignments):
+    return "".join([str(int(x)) for x in assignments])
+
+
+def _encodeLowMode(enabled, temperature, start_datetime, end_datetime):
+    return "{:03d}{}{}".format(
+        int(temperature),
+        (
+            start_datetime.strftime("%Y-%m-%d%H:%M")
+            if enabled and start_datetime
+            else " " * 15
+        ),
+        (
+            end_datetime.strftime("%Y-%m-%d%H:%M")
+            if enabled and end_datetime
+            else " " * 15
+        ),
+    )
+
+
+def _encodeCircuitSchedules(circuit_id, day_schedules, starting_day):
+    """Encode circuit schedules the way `setCircuitSchedules()` sends them."""
+    # Make sure that day_schedules is list with length 21, if not append None's at the end
+    day_schedules = list(day_schedules) + [None for _ in range(21 - len(day_schedules))]
+
+    # Make sure there are no undefined gaps
+    for idx in range(len(day_schedules) - 1):
+        if day_schedules[idx] is None and day_schedules[idx + 1] is not None:
+            raise Exception("Circuit schedules can't have any undefined gaps.")
+
+    # Example: 000108-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1
+    return "{:02d}{:02d}{}".format(
+        circuit_id,
+        starting_day,
+        "".join(
+            ["{:02d}".format(x if x is not None else -1) for x in day_schedules]
+        ),
+    )
+
+
+def validateSchedulePlan(plan):
+    """Check a schedule plan without talking to the controller. Return a dict
+    of ("schedule", schedule_id) or ("circuit", circuit_id) -> encoded
+    payload. Raise an exception describing all invalid entries.
+
+    The plan is a dict:
+
+      {
+          "schedules": {schedule_id: {"name": ..., "timetable": [...]}, ...},
+          "circuits": {circuit_id: {"day_schedules": [...], "starting_day": 1}, ...},
+      }
+    """
+    payloads = {}
+    errors = []
+    for schedule_id, schedule in plan.get("schedules", {}).items():
+        try:
+            payloads[("schedule", schedule_id)] = _encodeSchedule(
+                schedule_id, schedule["name"], schedule["timetable"]
+            )
+        except Exception as e:
+            errors.append("schedule {}: {}".format(schedule_id, e))
+    for circuit_id, circuit in plan.get("circuits", {}).items():
+        try:
+            payloads[("circuit", circuit_id)] = _encodeCircuitSchedules(
+                circuit_id, circuit["day_schedules"], circuit.get("starting_day", 1)
+            )
+        except Exception as e:
+            errors.append("circuit {}: {}".format(circuit_id, e))
+    if errors:
+        raise Exception("Invalid schedule plan: {}".format("; ".join(errors)))
+    return payloads
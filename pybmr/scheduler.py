@@ -0,0 +1,189 @@
+"""Adaptive polling of BMR controllers.
+
+Instead of polling every circuit at a fixed interval, `AdaptivePoller`
+spends a fixed budget of polls per second where the state is changing:
+
+- A circuit is polled at `min_interval` while it changes (heating or cooling
+  switched, temperature moved by at least `temperature_threshold`, target
+  temperature changed). Otherwise its interval doubles on every unchanged
+  reading, up to `max_interval`.
+- A circuit is polled right after the next entry of its active schedule
+  timetable, when the target temperature is about to change.
+- Static endpoints (schedule names, circuit schedule assignments and the
+  schedules themselves) start at `max_interval` and double on every unchanged
+  reading, up to `static_max_interval`.
+
+A poll is a single `Bmr` getter call. It may cost more than one HTTP
+request (a login, validation re-fetches of malformed data), and other users
+of the same `Bmr` client are not limited by the budget.
+
+Note that `Bmr` caches the readings, intervals shorter than its cache TTL
+won't produce fresher data.
+"""
+
+from datetime import datetime, timedelta
+import heapq
+import logging
+import time
+
+from pybmr import CACHE_DEFAULT_TTL, RateLimiter
+
+SCHEDULER_DEFAULT_BUDGET = 1.0  # polls per second
+SCHEDULER_DEFAULT_MIN_INTERVAL = CACHE_DEFAULT_TTL  # seconds
+SCHEDULER_DEFAULT_MAX_INTERVAL = 600  # seconds
+SCHEDULER_DEFAULT_STATIC_MAX_INTERVAL = 24 * 3600  # seconds
+SCHEDULER_DEFAULT_TEMPERATURE_THRESHOLD = 0.2  # degrees
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptivePoller:
+    """Poll circuits of a single controller within a budget of `budget` polls
+    per second. `callback(key, value)` is called with every new reading,
+    `key` is one of ("circuit", circuit_id), ("circuit_schedules",
+    circuit_id), ("schedule", schedule_id) or ("schedules",).
+    """
+
+    def __init__(
+        self,
+        bmr,
+        callback=None,
+        budget=SCHEDULER_DEFAULT_BUDGET,
+        min_interval=SCHEDULER_DEFAULT_MIN_INTERVAL,
+        max_interval=SCHEDULER_DEFAULT_MAX_INTERVAL,
+        static_max_interval=SCHEDULER_DEFAULT_STATIC_MAX_INTERVAL,
+        temperature_threshold=SCHEDULER_DEFAULT_TEMPERATURE_THRESHOLD,
+    ):
+        self.bmr = bmr
+        self.callback = callback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.static_max_interval = static_max_interval
+        self.temperature_threshold = temperature_threshold
+        self.readings = {}
+        self.intervals = {}
+        self._limiter = RateLimiter(budget)
+        self._queue = []
+        self._scheduled = set()
+        self._counter = 0
+
+    def _schedule(self, key, delay):
+        self._counter += 1
+        heapq.heappush(self._queue, (time.monotonic() + delay, self._counter, key))
+        self._scheduled.add(key)
+
+    def start(self):
+        """Schedule the initial reading of all circuits and static endpoints."""
+        self._schedule(("schedules",), 0)
+        for circuit_id in range(self.bmr.getNumCircuits()):
+            self._schedule(("circuit_schedules", circuit_id), 0)
+            self._schedule(("circuit", circuit_id), 0)
+
+    def _load(self, key):
+        kind = key[0]
+        if kind == "circuit":
+            return self.bmr.getCircuit(key[1])
+        if kind == "circuit_schedules":
+            return self.bmr.getCircuitSchedules(key[1])
+        if kind == "schedule":
+            return self.bmr.getSchedule(key[1])
+        return self.bmr.getSchedules()
+
+    def _circuit_changed(self, previous, current):
+        if previous is None:
+            return True
+        for field in ("enabled", "heating", "cooling", "target_temperature"):
+            if previous[field] != current[field]:
+                return True
+        if previous["temperature"] is None or current["temperature"] is None:
+            return previous["temperature"] != current["temperature"]
+        return abs(current["temperature"] - previous["temperature"]) >= self.temperature_threshold
+
+    def secondsToTargetChange(self, circuit_id, now=None):
+        """Return the number of seconds until the next timetable entry of the
+        schedule active for the circuit, or None if it's not known yet.
+        """
+        circuit_schedules = self.readings.get(("circuit_schedules", circuit_id))
+        if not circuit_schedules or not circuit_schedules["current_day"]:
+            return None
+        schedule_id = circuit_schedules["day_schedules"][circuit_schedules["current_day"] - 1]
+        schedule = self.readings.get(("schedule", schedule_id))
+        if not schedule or not schedule["timetable"]:
+            return None
+        now = now or datetime.now()
+        for entry in schedule["timetable"]:
+            hours, minutes = entry["time"].split(":")
+            at = now.replace(hour=int(hours), minute=int(minutes), second=0, microsecond=0)
+            if at > now:
+                return (at - now).total_seconds()
+        # The day schedule rotates at midnight
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        return (midnight - now).total_seconds()
+
+    def _next_interval(self, key, previous, current):
+        kind = key[0]
+        interval = self.intervals.get(key)
+        if kind == "circuit":
+            if interval is None or self._circuit_changed(previous, current):
+                interval = self.min_interval
+            else:
+                interval = min(interval * 2, self.max_interval)
+            self.intervals[key] = interval
+            # Don't miss the change of target temperature. The controller
+            # applies the timetable entry a moment after its time.
+            target_change = self.secondsToTargetChange(key[1])
+            if target_change is not None:
+                interval = min(interval, max(target_change + self.min_interval, self.min_interval))
+            return interval
+        if interval is None or previous != current:
+            interval = self.max_interval
+        else:
+            interval = min(interval * 2, self.static_max_interval)
+        self.intervals[key] = interval
+        return interval
+
+    def poll(self, key):
+        """Load the reading for `key` now and schedule the next one."""
+        self._scheduled.discard(key)
+        previous = self.readings.get(key)
+        try:
+            current = self._load(key)
+        except Exception:
+            logger.exception("Failed to load %s", key)
+            self._schedule(key, self.intervals.get(key, self.min_interval))
+            return
+        self.readings[key] = current
+        self._schedule(key, self._next_interval(key, previous, current))
+        if key[0] == "circuit_schedules":
+            for schedule_id in current["day_schedules"]:
+                if ("schedule", schedule_id) not in self._scheduled:
+                    self._schedule(("schedule", schedule_id), 0)
+        if self.callback is not None and previous != current:
+            self.callback(key, current)
+
+    def step(self, stop_event=None):
+        """Wait until the next reading is due, then load it within the
+        budget. Return its key, or None if `stop_event` (a
+        `threading.Event`) was set while waiting.
+        """
+        entry = heapq.heappop(self._queue)
+        delay = entry[0] - time.monotonic()
+        if delay > 0:
+            if stop_event is None:
+                time.sleep(delay)
+            elif stop_event.wait(delay):
+                heapq.heappush(self._queue, entry)
+                return None
+        self._limiter.acquire()
+        if stop_event is not None and stop_event.is_set():
+            heapq.heappush(self._queue, entry)
+            return None
+        self.poll(entry[2])
+        return entry[2]
+
+    def run(self, stop_event):
+        """Poll until `stop_event` (a `threading.Event`) is set."""
+        if not self._queue:
+            self.start()
+        while not stop_event.is_set():
+            self.step(stop_event)
@@ -0,0 +1,324 @@
+"""Multi-process polling of a large fleet of BMR controllers.
+
+The controllers are sharded across worker processes, so parsing and HTTP
+overhead are spread over all cores instead of being bound by the GIL. Each
+worker owns the `Bmr` clients of its shard and writes the decoded circuit
+state into a shared memory block, which the parent (or any other process,
+see `FleetState.attach()`) reads without pickling or copying.
+
+The block starts with a heartbeat per shard (`HEARTBEAT`), followed by a
+fixed-size slot per controller:
+
+  seq    Q sequence number of the seqlock, odd while the slot is written
+  info   d timestamp of the last successful poll, B number of circuits,
+         B status, 2x padding, I number of failed polls
+  data   up to `SHARDED_MAX_CIRCUITS` circuits packed with the snapshot
+         `CIRCUIT` layout
+
+Every slot has a single writer; readers retry until they see the same even
+sequence number before and after reading it. A slot left odd by a worker
+killed in the middle of writing it is released when the worker is
+restarted.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import multiprocessing
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import os
+import struct
+from threading import Thread
+import time
+from typing import NamedTuple
+
+from pybmr import CACHE_DEFAULT_TTL, Bmr
+from pybmr.snapshot import CIRCUIT, circuitStates, packCircuit, unpackCircuits
+
+SHARDED_MAX_CIRCUITS = 64
+SHARDED_DEFAULT_THREADS = 8  # controllers polled in parallel by a worker
+SHARDED_SUPERVISE_INTERVAL = 1  # seconds between checks of the workers
+
+HEARTBEAT = struct.Struct("<d")
+SEQ = struct.Struct("<Q")
+INFO = struct.Struct("<dBBxxI")
+SLOT_SIZE = SEQ.size + INFO.size + CIRCUIT.size * SHARDED_MAX_CIRCUITS
+
+STATUS_PENDING = 0  # not polled yet
+STATUS_OK = 1
+STATUS_ERROR = 2  # the last poll failed, circuits are from the last successful one
+
+logger = logging.getLogger(__name__)
+
+
+# Names of the shared memory blocks created by this process
+_created = set()
+
+
+def _attachSharedMemory(name, shared_tracker=False):
+    """Attach to the shared memory block `name` without leaving it registered
+    with the resource tracker of this process, which would unlink the block
+    when the process exits. Set `shared_tracker` in processes started by the
+    creator of the block: they share its resource tracker, which keeps a
+    single registration per block, so unregistering would drop the one of
+    the creator.
+    """
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers the block
+        shm = SharedMemory(name=name)
+        if not shared_tracker and shm.name not in _created:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class ControllerState(NamedTuple):
+    timestamp: float  # time of the last successful poll, 0 if none
+    status: int  # one of the STATUS_* constants
+    errors: int  # number of failed polls
+    circuits: tuple  # CircuitState
+
+
+class FleetState:
+    """Circuit state of a fleet of controllers in a shared memory block."""
+
+    def __init__(self, shm, num_controllers, num_shards):
+        self.shm = shm
+        self.num_controllers = num_controllers
+        self.num_shards = num_shards
+        self._buffer = shm.buf
+        self._slots = HEARTBEAT.size * num_shards
+
+    @staticmethod
+    def size(num_controllers, num_shards):
+        """Size in bytes of the shared memory block."""
+        return HEARTBEAT.size * num_shards + SLOT_SIZE * num_controllers
+
+    @classmethod
+    def create(cls, num_controllers, num_shards):
+        shm = SharedMemory(create=True, size=cls.size(num_controllers, num_shards))
+        shm.buf[:] = bytes(shm.size)
+        _created.add(shm.name)
+        return cls(shm, num_controllers, num_shards)
+
+    @classmethod
+    def attach(cls, name, num_controllers, num_shards):
+        """Attach to the block `name` created by another process, e.g. the
+        `ShardedPoller`. The block isn't unlinked when this process exits.
+        """
+        return cls(_attachSharedMemory(name), num_controllers, num_shards)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def heartbeat(self, shard):
+        """Return the time the `shard` worker was last seen alive."""
+        return HEARTBEAT.unpack_from(self._buffer, HEARTBEAT.size * shard)[0]
+
+    def beat(self, shard, timestamp):
+        HEARTBEAT.pack_into(self._buffer, HEARTBEAT.size * shard, timestamp)
+
+    def write(self, index, timestamp, circuits=None):
+        """Store the `circuits` of the controller `index` polled at
+        `timestamp`, or count a failed poll if `circuits` is None.
+        """
+        offset = self._slots + SLOT_SIZE * index
+        # Round up, the previous writer may have died in the middle of writing
+        seq = (SEQ.unpack_from(self._buffer, offset)[0] + 1) & ~1
+        SEQ.pack_into(self._buffer, offset, seq + 1)
+        old_timestamp, num_circuits, _, errors = INFO.unpack_from(self._buffer, offset + SEQ.size)
+        if circuits is None:
+            INFO.pack_into(self._buffer, offset + SEQ.size, old_timestamp, num_circuits, STATUS_ERROR, errors + 1)
+        else:
+            circuits = circuits[:SHARDED_MAX_CIRCUITS]
+            data = offset + SEQ.size + INFO.size
+            for idx, circuit in enumerate(circuits):
+                packCircuit(self._buffer, data + CIRCUIT.size * idx, circuit)
+            INFO.pack_into(self._buffer, offset + SEQ.size, timestamp, len(circuits), STATUS_OK, errors)
+        SEQ.pack_into(self._buffer, offset, seq + 2)
+
+    def release(self, index):
+        """Release the slot of the controller `index` if its writer died in
+        the middle of writing it. The circuits may be torn, so they are
+        dropped and the poll is counted as failed.
+        """
+        offset = self._slots + SLOT_SIZE * index
+        seq = SEQ.unpack_from(self._buffer, offset)[0]
+        if seq & 1:
+            timestamp, _, _, errors = INFO.unpack_from(self._buffer, offset + SEQ.size)
+            INFO.pack_into(self._buffer, offset + SEQ.size, timestamp, 0, STATUS_ERROR, errors + 1)
+            SEQ.pack_into(self._buffer, offset, seq + 1)
+
+    def read(self, index):
+        """Return `ControllerState` of the controller `index`."""
+        offset = self._slots + SLOT_SIZE * index
+        data = offset + SEQ.size + INFO.size
+        while True:
+            seq = SEQ.unpack_from(self._buffer, offset)[0]
+            if seq & 1:
+                time.sleep(0)
+                continue
+            timestamp, num_circuits, status, errors = INFO.unpack_from(self._buffer, offset + SEQ.size)
+            with self._buffer[data : data + CIRCUIT.size * num_circuits] as view:
+                circuits = tuple(unpackCircuits(view))
+            if SEQ.unpack_from(self._buffer, offset)[0] == seq:
+                return ControllerState(timestamp, status, errors, circuits)
+
+    def readAll(self):
+        """Return `ControllerState` of all controllers."""
+        return [self.read(index) for index in range(self.num_controllers)]
+
+    def close(self):
+        self._buffer = None
+        self.shm.close()
+
+
+def _worker(shard, controllers, name, num_controllers, num_shards, interval, threads, stop):
+    """Poll `controllers`, a list of (index, `Bmr` keyword arguments), until
+    `stop` is set.
+    """
+    state = FleetState(_attachSharedMemory(name, shared_tracker=True), num_controllers, num_shards)
+    clients = [(index, Bmr(**dict({"cache_ttl": 0}, **kwargs))) for index, kwargs in controllers]
+
+    def poll(client):
+        index, bmr = client
+        try:
+            with bmr.loggedIn():
+                circuits = circuitStates(bmr)
+        except Exception:
+            logger.exception("Failed to poll controller %s", index)
+            circuits = None
+        state.write(index, time.time(), circuits)
+
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            while not stop.is_set():
+                start = time.time()
+                state.beat(shard, start)
+                list(pool.map(poll, clients))
+                state.beat(shard, time.time())
+                stop.wait(max(0, interval - (time.time() - start)))
+    finally:
+        state.close()
+
+
+class ShardedPoller:
+    """Poller of a fleet of controllers sharded across `processes` worker
+    processes (one per CPU by default), each polling at most `threads` of
+    its controllers in parallel every `interval` seconds.
+
+    `controllers` is a list of dicts of `Bmr` keyword arguments, e.g.
+    {"base_url": ..., "user": ..., "password": ...}; the clients are created
+    in the workers. Workers that die, or don't finish a poll cycle within
+    `stall_timeout` seconds, are restarted.
+    """
+
+    def __init__(
+        self,
+        controllers,
+        processes=None,
+        interval=CACHE_DEFAULT_TTL,
+        threads=SHARDED_DEFAULT_THREADS,
+        stall_timeout=None,
+        start_method="spawn",
+    ):
+        self.controllers = list(controllers)
+        self.processes = min(processes or os.cpu_count() or 1, len(self.controllers)) or 1
+        self.interval = interval
+        self.threads = threads
+        self.stall_timeout = stall_timeout
+        self.restarts = [0] * self.processes
+        self.state = None
+        self._context = multiprocessing.get_context(start_method)
+        self._stop = self._context.Event()
+        self._workers = []
+        self._supervisor = None
+
+    def _spawn(self, shard):
+        for index in range(shard, len(self.controllers), self.processes):
+            self.state.release(index)
+        self.state.beat(shard, time.time())
+        process = self._context.Process(
+            target=_worker,
+            args=(
+                shard,
+                [(i, c) for i, c in enumerate(self.controllers) if i % self.processes == shard],
+                self.state.name,
+                len(self.controllers),
+                self.processes,
+                self.interval,
+                self.threads,
+                self._stop,
+            ),
+            name="bmr-poller-{}".format(shard),
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def _supervise(self):
+        while not self._stop.wait(SHARDED_SUPERVISE_INTERVAL):
+            for shard, process in enumerate(self._workers):
+                stalled = (
+                    self.stall_timeout is not None
+                    and time.time() - self.state.heartbeat(shard) > self.interval + self.stall_timeout
+                )
+                if process.is_alive() and not stalled:
+                    continue
+                if self._stop.is_set():
+                    return
+                logger.warning(
+                    "Restarting poller worker %s (%s)",
+                    shard,
+                    "stalled" if stalled else "exit code {}".format(process.exitcode),
+                )
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+                self.restarts[shard] += 1
+                self._workers[shard] = self._spawn(shard)
+
+    def start(self):
+        """Create the shared memory block and start the workers and their
+        supervisor.
+        """
+        self._stop.clear()
+        self.state = FleetState.create(len(self.controllers), self.processes)
+        self._workers = [self._spawn(shard) for shard in range(self.processes)]
+        self._supervisor = Thread(target=self._supervise, name="bmr-poller-supervisor", daemon=True)
+        self._supervisor.start()
+
+    def stop(self, timeout=None):
+        """Stop the workers and release the shared memory block. Does nothing
+        if the poller isn't running.
+        """
+        self._stop.set()
+        if self._supervisor is None:
+            return
+        self._supervisor.join()
+        self._supervisor = None
+        for process in self._workers:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._workers = []
+        name = self.state.name
+        self.state.close()
+        self.state.shm.unlink()
+        _created.discard(name)
+
+    @property
+    def name(self):
+        """Name of the shared memory block, see `FleetState.attach()`."""
+        return self.state.name
+
+    def read(self, index):
+        """Return `ControllerState` of the controller `index`."""
+        return self.state.read(index)
+
+    def readAll(self):
+        """Return `ControllerState` of all controllers."""
+        return self.state.readAll()
@@ -0,0 +1,256 @@
+"""Roller shutters and wind sensors."""
+
+from concurrent.futures import ThreadPoolExecutor
+import re
+from typing import NamedTuple
+
+from pybmr.auth import authenticated
+from pybmr.cache import cached
+from pybmr.const import HTTP_DEFAULT_MAX_WORKERS, MAX_ROLLER_SHUTTERS
+from pybmr.errors import MalformedDataError
+from pybmr.parsers import parseNames
+
+
+class RollerShutterStatus(NamedTuple):
+    """Decoded status of a single roller shutter.
+
+    Raw data returned from server:
+
+      1Kuchyna      0000010000000000000
+
+    Byte offsets of:
+      POS_ENABLED = 0
+      POS_NAME = 1
+      POS_POSITION = 14
+      POS_TILT = 15
+      POS_STATUS = 17
+
+    The meaning of the 16 trailing status characters is not documented, they
+    are returned as a tuple of digits.
+    """
+
+    id: int
+    enabled: bool
+    name: str
+    pos: int
+    tilt: int
+    status: tuple
+
+    @classmethod
+    def fromText(cls, shutter_id, text):
+        match = re.match(
+            r"""
+                (?P<enabled>[01])      # Whether the shutter is enabled
+                (?P<name>.{13})        # Name of the shutter
+                (?P<pos>\d)            # Position
+                (?P<tilt>\d{2})        # Tilt
+                (?P<status>\d{16})     # Undocumented status digits
+                """,
+            text,
+            re.VERBOSE,
+        )
+        if not match:
+            raise MalformedDataError(
+                "Server returned malformed data: {}. Try again later".format(
+                    text
+                )
+            )
+        return cls(
+            id=shutter_id,
+            enabled=match.group("enabled") == "1",
+            name=match.group("name").strip(),
+            pos=int(match.group("pos")),
+            tilt=int(match.group("tilt")),
+            status=tuple(int(x) for x in match.group("status")),
+        )
+
+
+class WindSensorStatus(NamedTuple):
+    """Decoded wind sensor status.
+
+    Raw data returned from server:
+
+      0000000001111111111111111111111111111111100000000000
+
+    Character N of the raw data is stored as bit N of `mask`. The layout is
+    not documented, we assume that the first `MAX_ROLLER_SHUTTERS` characters
+    are wind locks of the roller shutters (character N locks shutter N) and
+    the remaining characters belong to the wind sensors.
+    """
+
+    mask: int
+    length: int
+
+    @classmethod
+    def fromText(cls, text):
+        if text.strip("01"):
+            raise MalformedDataError(
+                "Server returned malformed data: {}. Try again later".format(text)
+            )
+        return cls(int(text[::-1], 2) if text else 0, len(text))
+
+    def isShutterLocked(self, shutter_id):
+        """Return True if the roller shutter is locked by the wind sensor."""
+        return shutter_id < MAX_ROLLER_SHUTTERS and bool(self.mask >> shutter_id & 1)
+
+    def lockedShutters(self):
+        """Return IDs of all roller shutters locked by the wind sensor."""
+        return _bits(self.mask & ((1 << MAX_ROLLER_SHUTTERS) - 1))
+
+    @property
+    def sensors(self):
+        """Bits of the wind sensors, i.e. everything after the shutters."""
+        return self.mask >> MAX_ROLLER_SHUTTERS
+
+    def changedShutters(self, other):
+        """Return IDs of roller shutters whose wind lock differs from `other`."""
+        return _bits((self.mask ^ other.mask) & ((1 << MAX_ROLLER_SHUTTERS) - 1))
+
+
+def _bits(mask):
+    """Return positions of bits set in `mask`."""
+    result = []
+    while mask:
+        low = mask & -mask
+        result.append(low.bit_length() - 1)
+        mask ^= low
+    return result
+
+
+class RollerShutterMixin:
+    """Roller shutter and wind sensor methods of `Bmr`."""
+
+    @cached()
+    @authenticated
+    def getNumOfRollerShutters(self) -> int:
+        """
+        Get the number of installed roller shutters.
+        Example call:
+        curl 'http://bmr-hc64.local/numOfRollerShutters' -H 'Content-Type: application/x-www-form-urlencoded; charset=UTF-8' \
+        --data-raw 'param=+'
+        """
+        data = {"param": "+"}
+        text = self._request("/numOfRollerShutters", data)
+        return int(text)
+
+
+    @cached()
+    @authenticated
+    def getListOfRollerShutters(self) -> list[str]:
+        """
+        Get the names of installed roller shutters as a list.
+        Example API response text: 'Kuchyna      Jedalen      Terasa velke Terasa male  Obyvacka 1   Obyvacka 2   Hostovska    Pracovna     Kupelna hore Spalna       Izba velka   Izba mala    '
+        Example call:
+        curl 'http://bmr-hc64.local/listOfRollerShutters' -H 'Content-Type: application/x-www-form-urlencoded; charset=UTF-8' --data-raw 'param=+'
+        """
+        data = {"param": "+"}
+        text = self._request("/listOfRollerShutters", data)
+        return self._parse(parseNames, text)
+
+
+    @cached()
+    @authenticated
+    def getWindSensorStatus(self):
+        """
+        Example API call:
+        curl 'http://bmr-hc64.local/windSensorStatus' -H 'Content-Type: application/x-www-form-urlencoded; charset=UTF-8' --data-raw 'param=+'
+        Example response:
+        0000000001111111111111111111111111111111100000000000
+        """
+        data = {"param": "+"}
+        text = self._request("/windSensorStatus", data)
+        return text
+
+    def getWindLocks(self) -> WindSensorStatus:
+        """
+        Get the decoded wind sensor status. When it differs from the status
+        loaded previously, call all callbacks registered by
+        `addWindChangeCallback()`.
+        """
+        status = WindSensorStatus.fromText(self.getWindSensorStatus())
+        previous, self._wind_status = self._wind_status, status
+        if previous is not None and previous.mask != status.mask:
+            for callback in self._wind_callbacks:
+                callback(previous, status)
+        return status
+
+    def addWindChangeCallback(self, callback):
+        """
+        Register a callback called as `callback(previous, current)` with two
+        `WindSensorStatus` instances whenever `getWindLocks()` detects a change.
+        """
+        self._wind_callbacks.append(callback)
+
+
+    @cached()
+    @authenticated
+    def getRollerShutterStatus(self, shutter_id: int) -> RollerShutterStatus:
+        """
+        Get the decoded status of a single roller shutter. Statuses are cached
+        per shutter ID.
+        Example API call:
+        curl 'http:///bmr-hc64.local/wholeRollerShutter' -H 'Content-Type: application/x-www-form-urlencoded; charset=UTF-8' --data-raw 'rollerShutter=6'
+        Example API response:
+        '1Kuchyna      0000010000000000000'
+        """
+        assert 0 <= shutter_id <= 32
+        data = {"rollerShutter": str(shutter_id)}
+        text = self._request("/wholeRollerShutter", data)
+        return self._parse(RollerShutterStatus.fromText, shutter_id, text)
+
+    def getWholeRollerShutter(self, shutter_id: int) -> dict:
+        """
+        Get the status of a single roller shutter as a dict. See
+        `getRollerShutterStatus()`.
+        """
+        return self.getRollerShutterStatus(shutter_id)._asdict()
+
+    @authenticated
+    def getAllRollerShutters(self, max_workers: int = HTTP_DEFAULT_MAX_WORKERS) -> list:
+        """
+        Get the decoded status of all installed roller shutters. The shutters
+        are loaded concurrently, using at most `max_workers` parallel requests.
+        """
+        num_shutters = self.getNumOfRollerShutters()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(self._withLogin(self.getRollerShutterStatus), range(num_shutters)))
+
+    @authenticated
+    def saveManualChange(self, shutter_id:int, pos:int, tilt:int) -> bool:
+        """
+        Set shutter blind to a specific position.
+
+        Formatting of the request data:
+        0-1: blind ID, starts from 0, simple decimal number, no bitmask - can't change multiple blinds with a single call
+        2: position. It maps from 100 fully open to 0 fully closed to:
+            0: open / otevreno (fully pulled up)
+            1: closed / zavreno (fully lowered down)
+            2: sits / sterbiny (3/4 down )
+            3: half / mezipoloha (in the middle)
+        3-4: tilt: It maps from 100 fully open to 0 fully closed to: <0 - 10>
+            0: open - segments horizontally, mamimum light passing through
+            10: closed - segments vertically, mimimum light pasing through
+            One step translates to a minimal impulse to the motors to open/close the blinds.
+            With my motors, 5 steps are enough to go from fully open to fully closed.
+            Position is relative. When going from 10 when closed to 5, blinds fully open, Same when going from 5 to 0.
+
+        Example call:
+        curl 'http://bmr-hc64.local/saveManualChange' -H 'Content-Type: application/x-www-form-urlencoded; charset=UTF-8' \
+        --data-raw 'manualChange=07200'
+        """
+        if not (0 <= shutter_id <= 32 and 0 <= pos <= 100 and 0 <= tilt <= 100):
+            raise Exception("Invalid roller shutter {}, position {} or tilt {}".format(shutter_id, pos, tilt))
+
+        bmr_pos:int = 1
+        if pos > 90:
+            bmr_pos = 0
+        elif pos > 45:
+            bmr_pos = 3
+        elif pos > 15:
+            bmr_pos = 2
+
+        bmr_tilt:int = int((100 - tilt) / 10)
+        data = {"manualChange": f"{shutter_id:02d}{bmr_pos:01d}{bmr_tilt:02d}"}
+        text = self._request("/saveManualChange", data)
+        self._invalidate("getRollerShutterStatus")
+        return "true" in text
@@ -0,0 +1,231 @@
+"""Compact binary encoding of the state of a BMR controller.
+
+A snapshot is packed with fixed `struct` layouts (all little-endian):
+
+  header   4s magic, B version, B kind, d timestamp, B flags,
+           B low mode temperature, B number of circuits, B number of shutters
+  circuit  B id, B flags, h temperature, h target temperature, h user offset,
+           h max offset, H warning
+  shutter  B id, B flags, B position, B tilt
+
+Temperatures are stored in tenths of a degree, `TEMPERATURE_UNKNOWN` stands
+for `None`. A delta snapshot has the same layout but carries only the
+circuits and shutters that changed since the previous snapshot.
+"""
+
+import struct
+from typing import NamedTuple
+
+from pybmr import UnsupportedFeatureError
+
+SNAPSHOT_MAGIC = b"BMRS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FULL = 0
+SNAPSHOT_DELTA = 1
+TEMPERATURE_UNKNOWN = -32768
+
+HEADER = struct.Struct("<4sBBdBBBB")
+CIRCUIT = struct.Struct("<BBhhhhH")
+SHUTTER = struct.Struct("<BBBB")
+
+# Header flags
+FLAG_SUMMER_MODE = 1 << 0
+FLAG_LOW_MODE = 1 << 1
+FLAG_HDO = 1 << 2
+
+# Circuit flags, in the order of the bits
+CIRCUIT_FLAGS = ("enabled", "heating", "cooling", "low_mode", "summer_mode")
+
+
+class CircuitState(NamedTuple):
+    id: int
+    enabled: bool
+    heating: bool
+    cooling: bool
+    low_mode: bool
+    summer_mode: bool
+    temperature: float
+    target_temperature: float
+    user_offset: float
+    max_offset: float
+    warning: int
+
+
+class ShutterState(NamedTuple):
+    id: int
+    enabled: bool
+    pos: int
+    tilt: int
+
+
+class Snapshot(NamedTuple):
+    timestamp: float
+    summer_mode: bool
+    low_mode: bool
+    low_mode_temperature: int
+    hdo: bool
+    circuits: tuple  # CircuitState
+    shutters: tuple = ()  # ShutterState
+
+
+def circuitStates(bmr):
+    """Load the state of all circuits of the controller. Return a tuple of
+    `CircuitState`.
+    """
+    circuits = []
+    for circuit_id in range(bmr.getNumCircuits()):
+        circuit = bmr.getCircuit(circuit_id)
+        circuits.append(
+            CircuitState(
+                circuit_id,
+                *(bool(circuit[flag]) for flag in CIRCUIT_FLAGS),
+                circuit["temperature"],
+                circuit["target_temperature"],
+                circuit["user_offset"],
+                circuit["max_offset"],
+                int(circuit["warning"]),
+            )
+        )
+    return tuple(circuits)
+
+
+def takeSnapshot(bmr, timestamp, shutters=False):
+    """Load the state of the controller into `Snapshot`. Set `shutters` to
+    include the roller shutters.
+    """
+    circuits = circuitStates(bmr)
+    low_mode = bmr.getLowMode()
+    try:
+        hdo = bmr.getHDO()
+    except UnsupportedFeatureError:
+        hdo = False
+    shutter_states = ()
+    if shutters:
+        shutter_states = tuple(
+            ShutterState(s.id, s.enabled, s.pos, s.tilt) for s in bmr.getAllRollerShutters()
+        )
+    return Snapshot(
+        timestamp,
+        bmr.getSummerMode(),
+        low_mode["enabled"],
+        low_mode["temperature"],
+        hdo,
+        circuits,
+        shutter_states,
+    )
+
+
+def _packTemperature(value):
+    return TEMPERATURE_UNKNOWN if value is None else round(value * 10)
+
+
+def _unpackTemperature(value):
+    return None if value == TEMPERATURE_UNKNOWN else value / 10
+
+
+def packCircuit(buffer, offset, circuit):
+    """Pack `CircuitState` into `buffer` at `offset` with the `CIRCUIT`
+    layout.
+    """
+    flags = 0
+    for bit, flag in enumerate(CIRCUIT_FLAGS):
+        flags |= getattr(circuit, flag) << bit
+    CIRCUIT.pack_into(
+        buffer,
+        offset,
+        circuit.id,
+        flags,
+        _packTemperature(circuit.temperature),
+        _packTemperature(circuit.target_temperature),
+        _packTemperature(circuit.user_offset),
+        _packTemperature(circuit.max_offset),
+        circuit.warning,
+    )
+
+
+def unpackCircuits(buffer):
+    """Yield `CircuitState` of every circuit packed in `buffer` with the
+    `CIRCUIT` layout.
+    """
+    for item_id, circuit_flags, temperature, target, user_offset, max_offset, warning in CIRCUIT.iter_unpack(
+        buffer
+    ):
+        yield CircuitState(
+            item_id,
+            *(bool(circuit_flags >> bit & 1) for bit in range(len(CIRCUIT_FLAGS))),
+            _unpackTemperature(temperature),
+            _unpackTemperature(target),
+            _unpackTemperature(user_offset),
+            _unpackTemperature(max_offset),
+            warning,
+        )
+
+
+def encode(snapshot, previous=None):
+    """Encode the snapshot to bytes. If `previous` snapshot is given, encode
+    only the circuits and shutters that changed since then.
+    """
+    circuits, shutters = snapshot.circuits, snapshot.shutters
+    if previous is not None:
+        old_circuits = {c.id: c for c in previous.circuits}
+        old_shutters = {s.id: s for s in previous.shutters}
+        circuits = [c for c in circuits if old_circuits.get(c.id) != c]
+        shutters = [s for s in shutters if old_shutters.get(s.id) != s]
+    buffer = bytearray(HEADER.size + CIRCUIT.size * len(circuits) + SHUTTER.size * len(shutters))
+    HEADER.pack_into(
+        buffer,
+        0,
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        SNAPSHOT_FULL if previous is None else SNAPSHOT_DELTA,
+        snapshot.timestamp,
+        (FLAG_SUMMER_MODE if snapshot.summer_mode else 0)
+        | (FLAG_LOW_MODE if snapshot.low_mode else 0)
+        | (FLAG_HDO if snapshot.hdo else 0),
+        snapshot.low_mode_temperature,
+        len(circuits),
+        len(shutters),
+    )
+    offset = HEADER.size
+    for c in circuits:
+        packCircuit(buffer, offset, c)
+        offset += CIRCUIT.size
+    for s in shutters:
+        SHUTTER.pack_into(buffer, offset, s.id, int(s.enabled), s.pos, s.tilt)
+        offset += SHUTTER.size
+    return bytes(buffer)
+
+
+def decode(buffer, previous=None):
+    """Decode a snapshot from bytes (or any buffer, e.g. a `memoryview`,
+    which is read without copying). A delta snapshot is applied to the
+    `previous` snapshot.
+    """
+    view = memoryview(buffer)
+    magic, version, kind, timestamp, flags, low_temperature, num_circuits, num_shutters = HEADER.unpack_from(
+        view
+    )
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise Exception("Unsupported snapshot format: {} version {}".format(magic, version))
+    if kind == SNAPSHOT_DELTA and previous is None:
+        raise Exception("Delta snapshot needs the previous snapshot")
+
+    offset = HEADER.size
+    end = offset + CIRCUIT.size * num_circuits
+    circuits = {c.id: c for c in unpackCircuits(view[offset:end])}
+    shutters = {
+        item_id: ShutterState(item_id, bool(shutter_flags & 1), pos, tilt)
+        for item_id, shutter_flags, pos, tilt in SHUTTER.iter_unpack(view[end : end + SHUTTER.size * num_shutters])
+    }
+    if kind == SNAPSHOT_DELTA:
+        circuits = {**{c.id: c for c in previous.circuits}, **circuits}
+        shutters = {**{s.id: s for s in previous.shutters}, **shutters}
+    return Snapshot(
+        timestamp,
+        bool(flags & FLAG_SUMMER_MODE),
+        bool(flags & FLAG_LOW_MODE),
+        low_temperature,
+        bool(flags & FLAG_HDO),
+        tuple(circuits[item_id] for item_id in sorted(circuits)),
+        tuple(shutters[item_id] for item_id in sorted(shutters)),
+    )
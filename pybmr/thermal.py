@@ -0,0 +1,180 @@
+"""Thermal models of heating circuits and pre-heat start time prediction.
+
+The temperature of every circuit is modelled as
+
+    dT/dt = a * heating + b * T + c        (degrees per hour)
+
+where `heating` is 1 while the circuit is heating. `-1 / b` is the cooling
+time constant and `a + b * T + c` the heating rate at temperature T. The
+coefficients of all circuits are fitted at once by least squares from
+sufficient statistics that are updated incrementally with every reading,
+so fitting and predicting a whole fleet are a few NumPy operations.
+
+Requires the optional `numpy` package.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+THERMAL_DEFAULT_MAX_GAP = 3600  # seconds, longer gaps between readings are ignored
+
+
+class ThermalModel:
+    """Thermal models of `num_circuits` circuits. With `forgetting` < 1 older
+    readings are weighted down exponentially, so the model follows slow
+    changes (e.g. the season).
+    """
+
+    def __init__(self, num_circuits, forgetting=1.0, max_gap=THERMAL_DEFAULT_MAX_GAP):
+        self.forgetting = forgetting
+        self.max_gap = max_gap
+        self.xtx = np.zeros((num_circuits, 3, 3))
+        self.xty = np.zeros((num_circuits, 3))
+        self.samples = np.zeros(num_circuits)
+        self._time = np.full(num_circuits, np.nan)
+        self._temperature = np.full(num_circuits, np.nan)
+        self._heating = np.zeros(num_circuits)
+
+    def _accumulate(self, x, slope, valid):
+        """Add samples `x` (..., n, 3) with observed `slope` (..., n) to the
+        statistics, leading axes are summed up.
+        """
+        n = self.samples.size
+        valid = valid.reshape(-1, n)
+        x = np.where(valid[..., None], x.reshape(-1, n, 3), 0.0)
+        slope = np.where(valid, slope.reshape(-1, n), 0.0)
+        self.xtx = self.forgetting * self.xtx + np.einsum("tni,tnj->nij", x, x)
+        self.xty = self.forgetting * self.xty + np.einsum("tni,tn->ni", x, slope)
+        self.samples = self.forgetting * self.samples + valid.sum(axis=0)
+
+    @staticmethod
+    def _samples(times, temperatures, heating, max_gap):
+        """Return the model inputs at the start of every interval between
+        consecutive readings, observed slopes and validity of the samples.
+        """
+        hours = (times[1:] - times[:-1]) / 3600
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slope = (temperatures[1:] - temperatures[:-1]) / hours
+        valid = np.isfinite(slope) & (hours > 0) & (hours <= max_gap / 3600)
+        x = np.stack([heating[:-1], temperatures[:-1], np.ones_like(temperatures[:-1])], axis=-1)
+        return x, slope, valid
+
+    def update(self, times, temperatures, heating):
+        """Add one reading per circuit. `times` are seconds since the epoch,
+        missing temperatures are NaN. All arguments are arrays (or scalars
+        for `times`) broadcastable to the number of circuits.
+        """
+        n = self.samples.size
+        times = np.broadcast_to(np.asarray(times, dtype=float), (n,))
+        temperatures = np.asarray(temperatures, dtype=float)
+        heating = np.asarray(heating, dtype=float)
+        x, slope, valid = self._samples(
+            np.stack([self._time, times]),
+            np.stack([self._temperature, temperatures]),
+            np.stack([self._heating, heating]),
+            self.max_gap,
+        )
+        self._accumulate(x, slope, valid)
+        known = np.isfinite(temperatures)
+        self._time = np.where(known, times, self._time)
+        self._temperature = np.where(known, temperatures, self._temperature)
+        self._heating = np.where(known, heating, self._heating)
+
+    def fitHistory(self, times, temperatures, heating):
+        """Add a history of readings at once: `times` has shape (T,) or
+        (T, n), `temperatures` and `heating` shape (T, n).
+        """
+        temperatures = np.asarray(temperatures, dtype=float)
+        times = np.broadcast_to(np.asarray(times, dtype=float).reshape(len(temperatures), -1), temperatures.shape)
+        heating = np.asarray(heating, dtype=float)
+        x, slope, valid = self._samples(times, temperatures, heating, self.max_gap)
+        if self.forgetting != 1.0:
+            for step in range(len(slope)):
+                self._accumulate(x[step], slope[step], valid[step])
+        else:
+            self._accumulate(x, slope, valid)
+        self._time, self._temperature, self._heating = times[-1], temperatures[-1], heating[-1]
+
+    @property
+    def coefficients(self):
+        """Array (n, 3) of the model coefficients a, b, c. Circuits without
+        enough readings have NaN coefficients.
+        """
+        # Pseudo-inverse copes with circuits that have no readings yet
+        result = (np.linalg.pinv(self.xtx) @ self.xty[..., None])[..., 0]
+        # Both heating and idle periods are needed to tell a and c apart
+        heated = self.xtx[:, 0, 0]
+        idle = self.samples - heated
+        result[(heated < 2) | (idle < 2)] = np.nan
+        return result
+
+    @property
+    def timeConstants(self):
+        """Cooling time constants of all circuits in hours."""
+        with np.errstate(divide="ignore"):
+            return -1 / self.coefficients[:, 1]
+
+    def preheatHours(self, temperatures, targets):
+        """Return hours of heating needed to get from `temperatures` to
+        `targets`. Infinite where the target can't be reached, NaN for
+        circuits without a model.
+        """
+        a, b, c = self.coefficients.T
+        temperatures = np.asarray(temperatures, dtype=float)
+        targets = np.asarray(targets, dtype=float)
+        k = a + c
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Solution of dT/dt = k + b * T, which converges to T = -k / b
+            equilibrium = -k / b
+            exponential = np.log((targets - equilibrium) / (temperatures - equilibrium)) / b
+            linear = (targets - temperatures) / k
+            hours = np.where(np.abs(b) > 1e-9, exponential, linear)
+            unreachable = np.where(np.abs(b) > 1e-9, (b > 0) | (targets >= equilibrium), k <= 0)
+        hours = np.where(unreachable, np.inf, hours)
+        hours = np.where(targets <= temperatures, 0.0, hours)
+        return np.where(np.isnan(k), np.nan, hours)
+
+    def preheatStart(self, temperatures, targets, target_times):
+        """Return times (seconds since the epoch) when heating has to start
+        to reach `targets` at `target_times`.
+        """
+        return np.asarray(target_times, dtype=float) - self.preheatHours(temperatures, targets) * 3600
+
+
+def nextTimetableEntry(timetable, now):
+    """Return (datetime, temperature) of the first entry of a schedule
+    timetable (as returned by `Bmr.getSchedule()`) after `now`. After the
+    last entry of the day the first entry of the next day is returned,
+    assuming the same schedule.
+    """
+    for day in (0, 1):
+        for entry in timetable:
+            hours, minutes = entry["time"].split(":")
+            at = datetime.combine(now.date() + timedelta(days=day), datetime.min.time()).replace(
+                hour=int(hours), minute=int(minutes)
+            )
+            if at > now:
+                return at, entry["temperature"]
+    return None
+
+
+def nextTargets(bmr, now=None):
+    """Return arrays of the next target temperatures of all circuits of the
+    controller and their times (seconds since the epoch), NaN where unknown.
+    """
+    now = now or datetime.now()
+    num_circuits = bmr.getNumCircuits()
+    targets = np.full(num_circuits, np.nan)
+    times = np.full(num_circuits, np.nan)
+    for circuit_id in range(num_circuits):
+        circuit_schedules = bmr.getCircuitSchedules(circuit_id)
+        if not circuit_schedules["current_day"]:
+            continue
+        schedule_id = circuit_schedules["day_schedules"][circuit_schedules["current_day"] - 1]
+        timetable = bmr.getSchedule(schedule_id)["timetable"]
+        entry = timetable and nextTimetableEntry(timetable, now)
+        if entry:
+            times[circuit_id] = entry[0].timestamp()
+            targets[circuit_id] = entry[1]
+    return targets, times
@@ -0,0 +1,223 @@
+"""Tracing of `Bmr` calls built on its hooks, see `Bmr.addHook()`.
+
+Every call of an API method becomes a span with child spans of its phases:
+logging in, requests (with their HTTP retries), parsing and cache hits, e.g.
+
+  getCircuit                      12.3 ms
+    request /menu.html             4.1 ms
+    request /wholeRoom             7.6 ms
+    parse parseCircuit             0.1 ms
+
+`SpanTracer` keeps the spans in memory, `OpenTelemetryTracer` reports them
+to OpenTelemetry. `createTracer()` picks the latter if it's installed.
+Spans are nested per thread, calls made by worker threads (e.g. in
+`getAllRollerShutters()`) become separate root spans.
+"""
+
+from collections import deque
+from threading import local
+import time
+
+from pybmr.auth import LOGIN_PATH
+
+TRACING_DEFAULT_MAX_SPANS = 1000  # root spans kept by SpanTracer
+
+
+class _HookTracer:
+    """Base class of tracers translating `Bmr` hooks into nested spans."""
+
+    def __init__(self):
+        self._local = local()
+        self._handlers = {
+            "before_call": lambda method, args: self._start(method, {"args": args}),
+            "after_call": lambda method, error: self._end({"error": error}),
+            "before_request": lambda path, data: self._start("request " + path, {"path": path}),
+            "after_response": lambda path, response, duration, error: self._end(
+                {
+                    "status_code": response.status_code if response is not None else None,
+                    "error": error,
+                }
+            ),
+            "on_retry": self._onRetry,
+            "on_parse": lambda parser, duration: self._record("parse " + parser, duration, {}),
+            "on_cache_hit": lambda method, args, age, stale: self._record(
+                "cache_hit " + method, 0.0, {"args": args, "age": age, "stale": stale}
+            ),
+        }
+
+    def attach(self, bmr):
+        """Start tracing calls of the `Bmr` client."""
+        for event, handler in self._handlers.items():
+            bmr.addHook(event, handler)
+        return self
+
+    def detach(self, bmr):
+        """Stop tracing calls of the `Bmr` client."""
+        for event, handler in self._handlers.items():
+            bmr.removeHook(event, handler)
+
+    @property
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _onRetry(self, path, method, retries, reason):
+        self._annotate({"retries": retries, "retry_reason": reason})
+
+    def _start(self, name, attributes):
+        raise NotImplementedError
+
+    def _end(self, attributes):
+        raise NotImplementedError
+
+    def _record(self, name, duration, attributes):
+        """Record a finished child span of `duration` seconds ending now."""
+        raise NotImplementedError
+
+    def _annotate(self, attributes):
+        """Add `attributes` to the current span."""
+        raise NotImplementedError
+
+
+class Span:
+    """Timed phase of a `Bmr` call. Times are `time.perf_counter()` values."""
+
+    def __init__(self, name, start, attributes=None):
+        self.name = name
+        self.start = start
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.children = []
+
+    @property
+    def duration(self):
+        return self.end - self.start if self.end is not None else None
+
+    @property
+    def kind(self):
+        """Kind of the phase: "call", "login", "request", "parse" or "cache_hit"."""
+        if self.name == "request " + LOGIN_PATH:
+            return "login"
+        kind = self.name.split(" ", 1)[0]
+        return kind if kind in ("request", "parse", "cache_hit") else "call"
+
+    def breakdown(self):
+        """Return a dict of phase kind -> seconds spent in it, including the
+        nested calls. Time not spent in any phase is reported as "self".
+        """
+        result = {"self": self.duration - sum(c.duration for c in self.children)}
+        for child in self.children:
+            if child.kind == "call":
+                for kind, seconds in child.breakdown().items():
+                    result[kind] = result.get(kind, 0.0) + seconds
+            else:
+                result[child.kind] = result.get(child.kind, 0.0) + child.duration
+        return result
+
+    def format(self, indent=0):
+        """Return the span and its children as an indented text tree."""
+        lines = ["{:<32}{:>8.1f} ms".format("  " * indent + self.name, self.duration * 1000)]
+        for child in self.children:
+            lines.append(child.format(indent + 1))
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return "Span({!r}, duration={!r})".format(self.name, self.duration)
+
+
+class SpanTracer(_HookTracer):
+    """Tracer keeping the last `max_spans` finished root spans in memory."""
+
+    def __init__(self, max_spans=TRACING_DEFAULT_MAX_SPANS):
+        super().__init__()
+        self.spans = deque(maxlen=max_spans)
+
+    def _add(self, span):
+        stack = self._stack
+        if stack:
+            stack[-1].children.append(span)
+        else:
+            self.spans.append(span)
+
+    def _start(self, name, attributes):
+        span = Span(name, time.perf_counter(), attributes)
+        self._add(span)
+        self._stack.append(span)
+
+    def _end(self, attributes):
+        span = self._stack.pop()
+        span.end = time.perf_counter()
+        span.attributes.update(attributes)
+
+    def _record(self, name, duration, attributes):
+        end = time.perf_counter()
+        span = Span(name, end - duration, attributes)
+        span.end = end
+        self._add(span)
+
+    def _annotate(self, attributes):
+        if self._stack:
+            self._stack[-1].attributes.update(attributes)
+
+
+class OpenTelemetryTracer(_HookTracer):
+    """Tracer reporting the spans to OpenTelemetry, using `tracer` or the
+    tracer of the "pybmr" instrumentation scope.
+    """
+
+    def __init__(self, tracer=None):
+        from opentelemetry import context, trace
+
+        super().__init__()
+        self._context = context
+        self._trace = trace
+        self._tracer = tracer or trace.get_tracer("pybmr")
+
+    @staticmethod
+    def _attributes(attributes):
+        # OpenTelemetry only accepts primitive attribute values
+        return {
+            k: v if isinstance(v, (bool, int, float, str)) else repr(v)
+            for k, v in attributes.items()
+            if v is not None
+        }
+
+    def _start(self, name, attributes):
+        span = self._tracer.start_span(name, attributes=self._attributes(attributes))
+        token = self._context.attach(self._trace.set_span_in_context(span))
+        self._stack.append((span, token))
+
+    def _end(self, attributes):
+        span, token = self._stack.pop()
+        self._context.detach(token)
+        span.set_attributes(self._attributes(attributes))
+        if attributes.get("error") is not None:
+            span.record_exception(attributes["error"])
+            span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+        span.end()
+
+    def _record(self, name, duration, attributes):
+        end = time.time_ns()
+        span = self._tracer.start_span(
+            name, start_time=end - int(duration * 1e9), attributes=self._attributes(attributes)
+        )
+        span.end(end_time=end)
+
+    def _annotate(self, attributes):
+        if self._stack:
+            self._stack[-1][0].set_attributes(self._attributes(attributes))
+
+
+def createTracer(bmr=None):
+    """Return `OpenTelemetryTracer` if OpenTelemetry is installed, otherwise
+    `SpanTracer`. Attach it to `bmr` if given.
+    """
+    try:
+        tracer = OpenTelemetryTracer()
+    except ImportError:
+        tracer = SpanTracer()
+    if bmr is not None:
+        tracer.attach(bmr)
+    return tracer
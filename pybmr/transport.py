@@ -0,0 +1,357 @@
+"""Transports used by `Bmr` to talk to the BMR controller.
+
+`requests` (with `requests_toolbelt` and urllib3) and `http.client` are only
+imported when the transport using them is created.
+"""
+
+from functools import lru_cache
+import json
+from threading import Lock
+import time
+from typing import NamedTuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from pybmr.const import (
+    CACHE_DEFAULT_MAXSIZE,
+    CAPTURE_REDACTED_FIELDS,
+    HTTP_DEFAULT_MAX_RETRIES,
+    HTTP_DEFAULT_TIMEOUT,
+    HTTP_FORM_HEADERS,
+    HTTP_RETRY_STATUSES,
+)
+
+
+@lru_cache(maxsize=None)
+def _timeoutHTTPAdapter():
+    """Return the `TimeoutHTTPAdapter` class. It's defined on first use, so
+    that `requests` is only imported when `RequestsTransport` is used.
+    """
+    from requests.adapters import HTTPAdapter
+
+    class TimeoutHTTPAdapter(HTTPAdapter):
+        def __init__(self, *args, **kwargs):
+            self.timeout = HTTP_DEFAULT_TIMEOUT
+            if "timeout" in kwargs:
+                self.timeout = kwargs["timeout"]
+                del kwargs["timeout"]
+            super().__init__(*args, **kwargs)
+
+        def send(self, request, **kwargs):
+            timeout = kwargs.get("timeout")
+            if timeout is None:
+                kwargs["timeout"] = self.timeout
+            return super().send(request, **kwargs)
+
+    return TimeoutHTTPAdapter
+
+
+def __getattr__(name):
+    if name == "TimeoutHTTPAdapter":
+        return _timeoutHTTPAdapter()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+class Response(NamedTuple):
+    """Response returned by transports."""
+
+    status_code: int
+    text: str
+    retries: int = 0  # number of retries needed to get the response
+
+
+class Transport:
+    """Base class of transports used by `Bmr` to talk to the BMR controller.
+
+    All BMR API endpoints are form POSTs, so a transport only has to provide
+    the `post()` method.
+    """
+
+    def post(self, path, data):
+        """Post `data` (either a dict or already encoded form data) to `path`
+        and return `Response`.
+        """
+        raise NotImplementedError
+
+    def probe(self, path, data):
+        """Post `data` to `path` once, without retries, e.g. to find out
+        whether the endpoint exists. Transports without retries don't have to
+        override it.
+        """
+        return self.post(path, data)
+
+    def close(self):
+        """Release resources held by the transport."""
+
+
+class RequestsTransport(Transport):
+    """Transport using the `requests` library. This is the default transport."""
+
+    def __init__(
+        self, base_url, timeout=HTTP_DEFAULT_TIMEOUT, max_retries=HTTP_DEFAULT_MAX_RETRIES
+    ):
+        from requests.packages.urllib3.util.retry import Retry
+        from requests_toolbelt import sessions
+
+        self.session = sessions.BaseUrlSession(base_url=base_url)
+
+        # Retry strategy for http requests
+        retries = Retry(
+            total=max_retries,
+            status_forcelist=HTTP_RETRY_STATUSES,
+            allowed_methods=[
+                "HEAD",
+                "GET",
+                "PUT",
+                "DELETE",
+                "OPTIONS",
+                "TRACE",
+                "POST",
+            ],
+            backoff_factor=1,  # this will do `sleep({backoff factor} * (2 ** ({number of retries} - 1)))`
+        )
+
+        # Include timeout for http requests
+        adapter = _timeoutHTTPAdapter()(timeout=timeout, max_retries=retries)
+
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # urllib3 retries are set per adapter, probes use their own session
+        self.probe_session = sessions.BaseUrlSession(base_url=base_url)
+        probe_adapter = _timeoutHTTPAdapter()(timeout=timeout, max_retries=0)
+        self.probe_session.mount("https://", probe_adapter)
+        self.probe_session.mount("http://", probe_adapter)
+
+    def post(self, path, data):
+        return self._post(self.session, path, data)
+
+    def probe(self, path, data):
+        return self._post(self.probe_session, path, data)
+
+    @staticmethod
+    def _post(session, path, data):
+        response = session.post(path, headers=HTTP_FORM_HEADERS, data=data)
+        # Retries are done by urllib3, the history is kept on the raw response
+        history = getattr(getattr(getattr(response, "raw", None), "retries", None), "history", None)
+        retries = len(history) if isinstance(history, tuple) else 0
+        return Response(response.status_code, response.text, retries)
+
+    def close(self):
+        self.session.close()
+        self.probe_session.close()
+
+
+class HTTPClientTransport(Transport):
+    """Lightweight transport using a persistent `http.client` connection.
+
+    Encoded request bodies and headers are kept as templates and reused for
+    repeated requests, so a poll costs little more than the socket I/O. The
+    retry strategy mimics the one of `RequestsTransport`. All threads share
+    the single connection: concurrent callers (e.g. the parallel requests of
+    `getAllRollerShutters()`) queue on it, one request at a time.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        timeout=HTTP_DEFAULT_TIMEOUT,
+        max_retries=HTTP_DEFAULT_MAX_RETRIES,
+        backoff_factor=1,
+    ):
+        from http.client import HTTPConnection, HTTPException, HTTPSConnection
+
+        url = urlsplit(base_url if "//" in base_url else "http://" + base_url)
+        self._connection_class = HTTPSConnection if url.scheme == "https" else HTTPConnection
+        self._errors = (OSError, HTTPException)
+        self._host = url.hostname
+        self._port = url.port
+        self._prefix = url.path.rstrip("/")
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._backoff_factor = backoff_factor
+        self._connection = None
+        self._templates = {}
+        self._lock = Lock()
+
+    def _template(self, path, data):
+        key = (path, data if isinstance(data, str) else tuple(data.items()))
+        template = self._templates.get(key)
+        if template is None:
+            body = (data if isinstance(data, str) else urlencode(data)).encode("utf-8")
+            headers = dict(HTTP_FORM_HEADERS, **{"Content-Length": str(len(body))})
+            template = (self._prefix + path, body, headers)
+            if len(self._templates) < CACHE_DEFAULT_MAXSIZE:
+                self._templates[key] = template
+        return template
+
+    def post(self, path, data):
+        return self._send(path, data, self._max_retries)
+
+    def probe(self, path, data):
+        return self._send(path, data, 0)
+
+    def _send(self, path, data, max_retries):
+        url, body, headers = self._template(path, data)
+        retries = 0
+        with self._lock:
+            while True:
+                try:
+                    if self._connection is None:
+                        self._connection = self._connection_class(
+                            self._host, self._port, timeout=self._timeout
+                        )
+                    self._connection.request("POST", url, body, headers)
+                    response = self._connection.getresponse()
+                    charset = response.headers.get_content_charset() or "iso-8859-1"
+                    text = response.read().decode(charset, "replace")
+                    if response.will_close:
+                        self._close()
+                    if response.status not in HTTP_RETRY_STATUSES or retries >= max_retries:
+                        return Response(response.status, text, retries)
+                except self._errors:
+                    self._close()
+                    if retries >= max_retries:
+                        raise
+                retries += 1
+                # The first retry is immediate, it's most likely just a
+                # keep-alive connection closed by the server
+                if retries > 1:
+                    time.sleep(self._backoff_factor * (2 ** (retries - 2)))
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+def _redact(data):
+    """Return form data with login credentials replaced by a placeholder."""
+    if isinstance(data, str):
+        fields = parse_qsl(data, keep_blank_values=True)
+        if not any(name in CAPTURE_REDACTED_FIELDS for name, _ in fields):
+            return data
+        return urlencode([(n, "*" if n in CAPTURE_REDACTED_FIELDS else v) for n, v in fields])
+    return {n: "*" if n in CAPTURE_REDACTED_FIELDS else v for n, v in data.items()}
+
+
+class CaptureTransport(Transport):
+    """Transport wrapper recording every exchange to an append-only file.
+
+    Each exchange is written as a single line of JSON with the time it
+    started, endpoint, form data (login credentials redacted), status, body,
+    latency in seconds and number of retries. Failed requests are recorded
+    with the error instead of the response.
+    """
+
+    def __init__(self, transport, path):
+        self._transport = transport
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = Lock()
+
+    def post(self, path, data):
+        return self._record(self._transport.post, path, data)
+
+    def probe(self, path, data):
+        return self._record(self._transport.probe, path, data)
+
+    def _record(self, send, path, data):
+        record = {"time": time.time(), "path": path, "data": _redact(data)}
+        start = time.perf_counter()
+        try:
+            response = send(path, data)
+        except Exception as e:
+            record.update(latency=time.perf_counter() - start, error=repr(e))
+            self._write(record)
+            raise
+        record.update(
+            latency=time.perf_counter() - start,
+            status=response.status_code,
+            text=response.text,
+            retries=response.retries,
+        )
+        self._write(record)
+        return response
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        self._transport.close()
+        self._file.close()
+
+
+class ReplayTransport(Transport):
+    """Transport replaying exchanges recorded by `CaptureTransport`.
+
+    Responses for the same endpoint and form data are replayed in the
+    recorded order, the last one is repeated once they run out. With
+    `realtime` the recorded latencies are replayed as well, otherwise the
+    responses are returned immediately.
+    """
+
+    def __init__(self, path, realtime=False):
+        self._realtime = realtime
+        self._records = {}
+        self._positions = {}
+        self._lock = Lock()
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                record = json.loads(line)
+                self._records.setdefault(self._key(record["path"], record["data"]), []).append(record)
+
+    @staticmethod
+    def _key(path, data):
+        return path, json.dumps(data, sort_keys=True)
+
+    def post(self, path, data):
+        key = self._key(path, _redact(data))
+        records = self._records.get(key)
+        if not records:
+            raise Exception("No recorded response for {} {}".format(path, data))
+        with self._lock:
+            position = self._positions.get(key, 0)
+            self._positions[key] = min(position + 1, len(records) - 1)
+        record = records[position]
+        if self._realtime:
+            time.sleep(record["latency"])
+        if "error" in record:
+            raise Exception("Replayed error: {}".format(record["error"]))
+        return Response(record["status"], record["text"], record["retries"])
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` acquisitions per second with
+    bursts of up to `burst` acquisitions.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self, blocking=True):
+        """Take a token, waiting for it if `blocking`. Return False if no
+        token is available and `blocking` is False.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1 and not blocking:
+                return False
+            # The token is reserved even if we have to wait for it, so that
+            # concurrent callers queue up behind each other
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+        return True
@@ -20,6 +20,7 @@ setuptools.setup(
     url="https://github.com/slesinger/pybmr",
     packages=setuptools.find_packages(),
     install_requires=install_requires,
+    extras_require={"mqtt": ["paho-mqtt"], "parquet": ["pyarrow"], "thermal": ["numpy"]},
     tests_require=tests_require,
     classifiers=[
         "Programming Language :: Python :: 3",
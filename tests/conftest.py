@@ -1,4 +1,7 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
 from unittest.mock import MagicMock
+from urllib.parse import parse_qsl
 
 import pytest
 
@@ -64,6 +67,8 @@ def fakeserver(url, headers=None, data=None):
         response.text = "1Kuchyna      0000010000000000000"
     elif url.endswith("/wholeRollerShutter") and data["rollerShutter"] == "1":
         response.text = "1Jedalen      0000010000000000000"
+    elif url.endswith("/wholeRollerShutter"):
+        response.text = "1Shutter {:<5}3050010000000000000".format(data["rollerShutter"])
     elif url.endswith("/rollerShutterIntermediate"):
         response.text = "Mezipoloha   "
     elif url.endswith("/saveManualChange") and data["manualChange"] == "07100":
@@ -77,5 +82,36 @@ def fakeserver(url, headers=None, data=None):
 def bmr():
     bmr = Bmr("0.0.0.0", "admin", "1234")
     bmr._http.post = fakeserver
+    bmr._transport.probe_session.post = fakeserver
 
     return bmr
+
+
+class FakeServerHandler(BaseHTTPRequestHandler):
+    """Serve `fakeserver()` responses over HTTP."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        response = fakeserver(self.path, data=dict(parse_qsl(body)))
+        text = response.text if isinstance(response.text, str) else ""
+        payload = text.encode("utf-8")
+        self.send_response(response.status_code)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeServerHandler)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}/".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
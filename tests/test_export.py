@@ -0,0 +1,52 @@
+import csv
+
+import pytest
+
+from pybmr import Bmr, export
+from tests.conftest import fakeserver
+from tests.test_pybmr import countingBmr
+
+
+def testWriteCsv(bmr, tmp_path):
+    path = tmp_path / "history.csv"
+    with open(path, "w", newline="") as fh:
+        assert export.writeCsv(export.pollCircuits([bmr], interval=0, count=2), fh) == 32
+    with open(path, newline="") as fh:
+        rows = list(csv.DictReader(fh))
+    assert len(rows) == 32
+    assert rows[0]["controller"] == "3ca28a9b"
+    assert rows[0]["temperature"] == "17.5"
+    assert rows[31]["id"] == "15"
+
+
+def testPollCircuitsSkipsFailures(bmr, monkeypatch):
+    broken = Bmr("0.0.0.0", "admin", "1234")
+    monkeypatch.setattr(broken, "getUniqueId", lambda: 1 / 0)
+    broken._http.post = fakeserver
+    get_circuit = bmr.getCircuit
+
+    def getCircuit(circuit_id):
+        if circuit_id == 3:
+            raise Exception("Server returned status code 500")
+        return get_circuit(circuit_id)
+
+    monkeypatch.setattr(bmr, "getCircuit", getCircuit)
+    readings = list(export.pollCircuits([broken, bmr], interval=0, count=2))
+    assert len(readings) == 30
+    assert 3 not in {r["id"] for r in readings}
+
+
+def testPollCircuitsSharesLogin():
+    bmr = countingBmr(cache_ttl=0)
+    assert len(list(export.pollCircuits([bmr], interval=0, count=2))) == 32
+    assert bmr.calls.count("/menu.html") == 2
+
+
+def testWriteParquet(bmr, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "history.parquet"
+    readings = export.pollCircuits([bmr], interval=0, count=3)
+    assert export.writeParquet(readings, path, row_group_size=20) == 48
+    metadata = pq.ParquetFile(path).metadata
+    assert metadata.num_rows == 48
+    assert metadata.num_row_groups == 3
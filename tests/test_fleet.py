@@ -0,0 +1,90 @@
+import pytest
+
+from pybmr import Bmr, validateSchedulePlan
+from pybmr.fleet import applySchedulePlan, warmUp
+from tests.conftest import fakeserver
+
+PLAN = {
+    "schedules": {
+        0: {
+            "name": "Schedule 1",
+            "timetable": [
+                {"time": "00:00", "temperature": 21},
+                {"time": "06:00", "temperature": 23},
+                {"time": "21:00", "temperature": 21},
+            ],
+        }
+    },
+    "circuits": {0: {"day_schedules": [1, 8, 9]}},
+}
+
+
+def testValidateSchedulePlan():
+    assert validateSchedulePlan(PLAN) == {
+        ("schedule", 0): "00Schedule 1   00:0002106:0002321:00021",
+        ("circuit", 0): "0001010809-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1-1",
+    }
+    plan = {
+        "schedules": {1: {"name": "Bad", "timetable": [{"time": "06:00", "temperature": 21}]}},
+        "circuits": {2: {"day_schedules": [1, None, 2]}},
+    }
+    with pytest.raises(Exception, match="schedule 1: First timetable.*; circuit 2: .*gaps"):
+        validateSchedulePlan(plan)
+
+
+def testApplySchedulePlan():
+    controllers = [Bmr("0.0.0.0", "admin", "1234") for _ in range(3)]
+    for bmr in controllers:
+        bmr._http.post = fakeserver
+        bmr._transport.probe_session.post = fakeserver
+    controllers[2]._http.post = None
+    controllers[2]._transport.probe_session.post = None
+
+    reports = applySchedulePlan(controllers, PLAN)
+    assert reports[0].written == [("schedule", 0), ("circuit", 0)]
+    assert reports[0].failed == {}
+    # The fake server always returns the same schedules
+    assert reports[0].mismatches == [("schedule", 0), ("circuit", 0)]
+    assert list(reports[2].failed) == [("controller", None)]
+
+
+def testWarmUp():
+    controllers = [Bmr("0.0.0.0", "admin", "1234") for _ in range(2)]
+    calls = []
+
+    def server(url, headers=None, data=None):
+        calls.append(url)
+        return fakeserver(url, headers, data)
+
+    controllers[0]._http.post = server
+    controllers[0]._transport.probe_session.post = server
+    controllers[1]._http.post = None
+    controllers[1]._transport.probe_session.post = None
+
+    ready, failed = warmUp(controllers)
+    assert ready.ready
+    assert set(ready.timings) == {
+        "login",
+        "probeCapabilities",
+        "getNumCircuits",
+        "getCircuitNames",
+        "getSchedules",
+        "getNumOfRollerShutters",
+        "getListOfRollerShutters",
+        "getUniqueId",
+    }
+    assert calls.count("/menu.html") == 1
+    assert calls.count("/listOfRooms") == 1
+    assert controllers[0]._capabilities == {"hdo": True, "roller_shutters": True, "wind_sensor": True}
+    assert not failed.ready
+    assert list(failed.errors) == ["login"]
+
+    # Everything is cached now
+    controllers[0].getCircuitNames()
+    controllers[0].getSchedules()
+    controllers[0].getNumOfRollerShutters()
+    controllers[0].getListOfRollerShutters()
+    assert calls.count("/listOfRooms") == 1
+    assert calls.count("/listOfModes") == 1
+    assert calls.count("/numOfRollerShutters") == 2
+    assert calls.count("/listOfRollerShutters") == 1
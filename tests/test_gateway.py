@@ -0,0 +1,73 @@
+import json
+from urllib.request import Request, urlopen
+
+import pytest
+
+from pybmr.gateway import Gateway, loadState
+from tests.test_pybmr import countingBmr
+
+
+@pytest.fixture
+def gateway(bmr):
+    gateway = Gateway(bmr, port=0, poll_interval=60)
+    gateway.start()
+    gateway.waitForChange(0, timeout=5)
+    yield gateway
+    gateway.stop()
+
+
+def url(gateway, path):
+    return "http://{}:{}{}".format(*gateway.address, path)
+
+
+def testGetState(gateway):
+    with urlopen(url(gateway, "/state")) as response:
+        state = json.load(response)
+    assert len(state["circuits"]) == 16
+    assert state["summer_mode"] is False
+    assert state["low_mode"] == {"enabled": False, "temperature": 18}
+    with urlopen(url(gateway, "/state/circuits/0/temperature")) as response:
+        assert json.load(response) == 17.5
+
+
+def testGetStateNotFound(gateway):
+    with pytest.raises(Exception, match="404"):
+        urlopen(url(gateway, "/state/circuits/99"))
+
+
+def testWrite(gateway):
+    request = Request(url(gateway, "/summer_mode"), data=b'{"enabled": true}', method="POST")
+    with urlopen(request) as response:
+        assert json.load(response) == {"result": True}
+
+
+def testEvents(gateway):
+    with urlopen(url(gateway, "/events")) as response:
+        lines = [response.readline() for _ in range(4)]
+    assert lines[0] == b"id: 1\n"
+    assert lines[1] == b"event: state\n"
+    assert json.loads(lines[2][len("data: ") :])["hdo"] is False
+
+
+def testPollChanges(gateway):
+    assert gateway.poll() == {}
+    gateway.bmr.getHDO = lambda: True
+    assert gateway.poll() == {"hdo": True}
+    assert gateway.version == 2
+
+
+def testLoadStateSharesLogin():
+    bmr = countingBmr()
+    state = loadState(bmr, shutters=True)
+    assert len(state["shutters"]) == 12
+    assert bmr.calls.count("/menu.html") == 1
+
+
+def testWriteRefreshFails(gateway, monkeypatch):
+    def fail(*args):
+        raise Exception("Controller is gone")
+
+    monkeypatch.setattr("pybmr.gateway.loadState", fail)
+    request = Request(url(gateway, "/summer_mode"), data=b'{"enabled": true}', method="POST")
+    with urlopen(request) as response:
+        assert json.load(response) == {"result": True}
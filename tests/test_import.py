@@ -0,0 +1,62 @@
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ("requests", "requests_toolbelt", "urllib3", "http.client")
+IMPORT_TIME_BUDGET = 0.05  # seconds for `import pybmr` itself
+
+
+def importProfile(code):
+    """Run `code` in a fresh interpreter with `-X importtime`. Return the
+    cumulative import time in seconds per top-level import.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import pybmr",
+        "from pybmr import Bmr",
+        "from pybmr import parsers, MalformedDataError, CACHE_DEFAULT_TTL",
+    ],
+)
+def testImportIsLight(code):
+    times = importProfile(code)
+    assert not [name for name in times if name in HEAVY_MODULES]
+
+
+def testImportTime():
+    times = importProfile("import pybmr")
+    assert times["pybmr"] < IMPORT_TIME_BUDGET
+    assert not [name for name in times if name.startswith("pybmr.")]
+
+
+def testHeavyModulesLoadedOnFirstUse():
+    code = "import sys; from pybmr import Bmr; Bmr('http://localhost', 'user', 'pass'); print('requests' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "True"
+
+
+def testLazyNames():
+    import pybmr
+    from pybmr.client import Bmr
+
+    assert pybmr.Bmr is Bmr
+    assert "Bmr" in dir(pybmr)
+    with pytest.raises(AttributeError):
+        pybmr.NoSuchName
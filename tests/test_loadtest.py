@@ -0,0 +1,61 @@
+import tracemalloc
+
+import pytest
+
+from pybmr import FEATURE_PROBES, Bmr, HTTPClientTransport
+from pybmr.loadtest import FakeController, runLoadTest
+
+
+@pytest.fixture
+def controller():
+    controller = FakeController().start()
+    yield controller
+    controller.stop()
+
+
+def testFakeController(controller):
+    bmr = Bmr(controller.url, "admin", "admin", transport=HTTPClientTransport(controller.url))
+    assert bmr.getNumCircuits() == 16
+    assert bmr.getCircuit(3)["name"] == "Circuit 3"
+    assert bmr.getCircuitSchedules(3) == {"starting_day": 1, "current_day": 1, "day_schedules": [3]}
+    assert bmr.getRollerShutterStatus(2).name == "Shutter 2"
+    assert bmr.setLowMode(False)
+    assert bmr.getLowMode() == {"enabled": False, "temperature": 18}
+    assert bmr.setSummerModeAssignments([1], True)
+    assert bmr.getSummerModeAssignments()[:3] == [False, True, False]
+
+
+@pytest.mark.parametrize("transport", [None, HTTPClientTransport])
+def testProbeWithoutRetries(controller, transport):
+    probes = {path for path, _ in FEATURE_PROBES.values()}
+    probed = []
+    handle = controller.handle
+
+    def unavailable(path, data):
+        if path in probes:
+            probed.append(path)
+            return 503, "Service unavailable"
+        return handle(path, data)
+
+    controller.handle = unavailable
+    bmr = Bmr(controller.url, "admin", "admin", transport=transport and transport(controller.url))
+    assert not any(bmr.probeCapabilities().values())
+    assert sorted(probed) == sorted(probes)
+
+
+def testRunLoadTest(controller):
+    clients = [{"base_url": controller.url, "user": "admin", "password": "admin", "cache_ttl": 0}] * 2
+    report = runLoadTest(clients, "mixed", consumers=4, duration=0.5, sample_interval=0.1)
+    assert report.calls > 0
+    assert report.errorRate == 0
+    assert report.requests >= report.calls
+    assert report.methods["getCircuit"]["p50"] <= report.methods["getCircuit"]["p99"]
+    assert len(report.memory) >= 5
+    assert report.memory[0][1] > 0
+    assert "getCircuit" in report.format()
+    assert not tracemalloc.is_tracing()
+
+    clients = [dict(clients[0], transport=HTTPClientTransport(controller.url))]
+    report = runLoadTest(clients, "dashboard", consumers=2, duration=0.2, sample_interval=0.1, trace_memory=True)
+    assert report.requests >= report.calls > 0
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,78 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from pybmr.mqtt import LocalBroker, MqttPublisher, topicMatches
+from tests.test_pybmr import countingBmr
+
+
+@pytest.fixture
+def broker():
+    return LocalBroker()
+
+
+def testTopicMatches():
+    assert topicMatches("bmr/+/set", "bmr/low_mode/set")
+    assert topicMatches("bmr/#", "bmr/circuits/0/name")
+    assert not topicMatches("bmr/+/set", "bmr/shutters/1/set")
+    assert not topicMatches("bmr/+", "bmr")
+
+
+def testPublishChangesOnly(bmr, broker, monkeypatch):
+    received = []
+    subscriber = broker.client()
+    subscriber.on_message = lambda client, userdata, message: received.append(message)
+    subscriber.subscribe("bmr/#")
+    publisher = MqttPublisher(bmr, broker.client(), poll_interval=60)
+
+    changes = publisher.poll()
+    assert changes["bmr/circuits/0/temperature"] == "17.5"
+    assert changes["bmr/summer_mode"] == "false"
+    assert changes["bmr/low_mode/temperature"] == "18"
+    assert broker.retained["bmr/circuits/0/name"].payload == b'"F01 Byt"'
+    assert len(received) == len(changes)
+
+    assert publisher.poll() == {}
+    assert len(received) == len(changes)
+
+    # Removed values are cleared, blank strings are not
+    publisher._published["bmr/circuits/99/name"] = '"Gone"'
+    assert publisher.poll() == {"bmr/circuits/99/name": None}
+    get_circuit = bmr.getCircuit
+    monkeypatch.setattr(bmr, "getCircuit", lambda circuit_id: dict(get_circuit(circuit_id), name=""))
+    publisher.poll()
+    assert broker.retained["bmr/circuits/0/name"].payload == b'""'
+
+
+def testPollSharesLogin(broker):
+    bmr = countingBmr()
+    publisher = MqttPublisher(bmr, broker.client(), poll_interval=60, shutters=True)
+    assert publisher.poll()["bmr/shutters/0/name"] == '"Kuchyna"'
+    assert bmr.calls.count("/menu.html") == 1
+
+
+def testWriteRefreshFails(bmr, broker, monkeypatch):
+    monkeypatch.setattr(bmr, "setSummerMode", MagicMock(return_value=True))
+    publisher = MqttPublisher(bmr, broker.client(), poll_interval=60)
+    monkeypatch.setattr("pybmr.mqtt.loadState", MagicMock(side_effect=Exception("Connection refused")))
+    assert publisher.write("setSummerMode", True)
+
+
+def testCommands(bmr, broker, monkeypatch):
+    monkeypatch.setattr(bmr, "saveManualChange", MagicMock(return_value=True))
+    monkeypatch.setattr(bmr, "setLowMode", MagicMock(return_value=True))
+    publisher = MqttPublisher(bmr, broker.client(), poll_interval=60)
+    publisher.start()
+    try:
+        client = broker.client()
+        client.publish("bmr/shutters/3/set", '{"pos": 100, "tilt": 50}')
+        client.publish("bmr/low_mode/set", "true")
+        client.publish("bmr/low_mode/set", "invalid")
+        deadline = time.monotonic() + 5
+        while not bmr.setLowMode.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        publisher.stop()
+    bmr.saveManualChange.assert_called_once_with(3, 100, 50)
+    bmr.setLowMode.assert_called_once_with(True, None)
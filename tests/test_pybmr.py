@@ -1,4 +1,20 @@
 from datetime import datetime
+import json
+import threading
+import time
+
+import pytest
+
+from pybmr import (
+    QUALITY_GOOD,
+    QUALITY_INVALID,
+    QUALITY_LAST_GOOD,
+    Bmr,
+    HTTPClientTransport,
+    ReplayTransport,
+    UnsupportedFeatureError,
+)
+from tests.conftest import fakeserver
 
 
 def testGetNumCircuits(bmr):
@@ -214,6 +230,24 @@ def testGetWindSensorStatus(bmr):
     assert bmr.getWindSensorStatus() == '0000000001111111111111111111111111111111100000000000'
 
 
+def testGetWindLocks(bmr):
+    status = bmr.getWindLocks()
+    assert status.length == 52
+    assert not status.isShutterLocked(8)
+    assert status.isShutterLocked(9)
+    assert status.lockedShutters() == list(range(9, 32))
+    assert status.sensors == 0b111111111
+
+
+def testWindChangeCallback(bmr):
+    changes = []
+    bmr.addWindChangeCallback(lambda previous, current: changes.append(current.changedShutters(previous)))
+    bmr.getWindLocks()
+    bmr._wind_status = bmr._wind_status._replace(mask=bmr._wind_status.mask ^ 0b101)
+    bmr.getWindLocks()
+    assert changes == [[0, 2]]
+
+
 def testGetWholeRollerShutter_0(bmr):
     """1Kuchyna      0000010000000000000"""
     shutter_id = 0
@@ -232,6 +266,17 @@ def testGetWholeRollerShutter_1(bmr):
     assert ret.get("tilt") == 0
 
 
+def testGetAllRollerShutters(bmr):
+    ret = bmr.getAllRollerShutters()
+    assert len(ret) == 12
+    assert ret[0].name == "Kuchyna"
+    assert ret[0].enabled
+    assert ret[11].name == "Shutter 11"
+    assert ret[11].pos == 3
+    assert ret[11].tilt == 5
+    assert ret[11].status == (0, 0, 1) + (0,) * 13
+
+
 # def test_rollerShutterIntermediate(bmr):
 #     response = requests.get('/rollerShutterIntermediate')
 #     assert response.text == 'Mezipoloha   '
@@ -249,3 +294,302 @@ def testSaveManualChange_07200(bmr):
     pos = 20  # sits
     tilt = 10  # almost closed
     assert bmr.saveManualChange(shutterId, pos, tilt) == True
+
+
+def testSaveManualChangeErrors(bmr):
+    with pytest.raises(Exception, match="Invalid roller shutter"):
+        bmr.saveManualChange(7, 101, 0)
+    server = bmr._http.post
+
+    def post(url, headers=None, data=None):
+        if url == "/saveManualChange":
+            raise ConnectionError("Connection refused")
+        return server(url, headers, data)
+
+    bmr._http.post = post
+    with pytest.raises(ConnectionError):
+        bmr.saveManualChange(7, 1, 100)
+
+
+def testHTTPClientTransport(server_url):
+    transport = HTTPClientTransport(server_url)
+    bmr = Bmr(server_url, "admin", "1234", transport=transport)
+    assert bmr.getNumCircuits() == 16
+    assert bmr.getCircuit(0)["temperature"] == 17.5
+    assert bmr.setCircuitSchedules(0, [1, 8, 9], 1)
+    assert len(transport._templates) == 4
+    transport.close()
+
+
+def testCaptureAndReplay(tmp_path):
+    capture = tmp_path / "capture.jsonl"
+    with Bmr("0.0.0.0", "admin", "1234", capture=capture) as bmr:
+        bmr._http.post = fakeserver
+        circuit = bmr.getCircuit(0)
+        assert bmr.setSummerMode(True)
+    assert bmr._transport._file.closed
+
+    records = [json.loads(line) for line in capture.read_text().splitlines()]
+    assert [r["path"] for r in records] == ["/menu.html", "/wholeRoom", "/menu.html", "/saveSummerMode"]
+    assert records[0]["data"] == {"loginName": "*", "passwd": "*"}
+    assert records[1]["text"] == "1F01 Byt      017.5+32032.0000.005.0000000000"
+
+    replayed = Bmr("0.0.0.0", "admin", "secret", transport=ReplayTransport(capture))
+    assert replayed.getCircuit(0) == circuit
+    assert replayed.setSummerMode(True)
+
+
+def countingBmr(**kwargs):
+    bmr = Bmr("0.0.0.0", "admin", "1234", **kwargs)
+    bmr.calls = []
+
+    def server(url, headers=None, data=None):
+        bmr.calls.append(url)
+        return fakeserver(url, headers, data)
+
+    bmr._http.post = server
+    bmr._transport.probe_session.post = server
+    return bmr
+
+
+def testCacheTtl():
+    bmr = countingBmr(cache_ttl=0)
+    bmr.getHDO()
+    bmr.getHDO()
+    assert bmr.calls.count("/loadHDO") == 2
+
+    bmr = countingBmr()
+    bmr.getHDO()
+    bmr.getHDO()
+    assert bmr.calls.count("/loadHDO") == 1
+    assert not bmr.lastRead.stale
+    bmr.clearCache()
+    bmr.getHDO()
+    assert bmr.calls.count("/loadHDO") == 2
+
+
+def testStaleWhileRevalidate():
+    bmr = countingBmr(cache_ttl=0.05, stale_while_revalidate=True, max_stale=10)
+    assert bmr.getNumOfRollerShutters() == 12
+    time.sleep(0.06)
+    assert bmr.getNumOfRollerShutters() == 12
+    assert bmr.lastRead.stale
+    assert bmr.lastRead.age >= 0.05
+    while bmr._refreshing:
+        time.sleep(0.01)
+    assert bmr.calls.count("/numOfRollerShutters") == 2
+    assert bmr.getNumOfRollerShutters() == 12
+    assert not bmr.lastRead.stale
+
+
+def testMaxStale():
+    bmr = countingBmr(cache_ttl=0.01, stale_while_revalidate=True, max_stale=0.01)
+    bmr.getNumOfRollerShutters()
+    time.sleep(0.03)
+    bmr.getNumOfRollerShutters()
+    assert not bmr.lastRead.stale
+    assert bmr.calls.count("/numOfRollerShutters") == 2
+
+
+def scriptedBmr(path, texts, **kwargs):
+    """Return Bmr whose responses from `path` are taken from `texts`."""
+    bmr = countingBmr(cache_ttl=0, **kwargs)
+    server = bmr._http.post
+    texts = iter(texts)
+
+    def scripted(url, headers=None, data=None):
+        response = server(url, headers, data)
+        if url == path:
+            response.text = next(texts)
+        return response
+
+    bmr._http.post = scripted
+    return bmr
+
+
+GOOD_CIRCUIT = "1F01 Byt      017.5+32032.0000.005.0000000000"
+BROKEN_CIRCUIT = "1F01 Byt      0-1-1+32032.0000.005.0000000000"
+
+
+def testValidatedReadRefetch():
+    bmr = scriptedBmr("/wholeRoom", [BROKEN_CIRCUIT, GOOD_CIRCUIT])
+    assert bmr.getCircuit(0)["temperature"] == 17.5
+    assert bmr.lastRead.quality == QUALITY_GOOD
+    assert bmr.calls.count("/wholeRoom") == 2
+
+
+def testValidatedReadLastGood():
+    bmr = scriptedBmr("/wholeRoom", [GOOD_CIRCUIT] + [BROKEN_CIRCUIT] * 3 + ["garbage"] * 3, validate_retries=2)
+    good = bmr.getCircuit(0)
+    assert bmr.getCircuit(0) == good
+    assert bmr.lastRead.quality == QUALITY_LAST_GOOD
+    assert bmr.getCircuit(0) == good
+    assert bmr.lastRead.quality == QUALITY_LAST_GOOD
+    assert bmr.calls.count("/wholeRoom") == 7
+
+
+def testValidatedReadInvalid():
+    bmr = scriptedBmr("/wholeRoom", [BROKEN_CIRCUIT] * 3, validate_retries=2)
+    assert bmr.getCircuit(0)["temperature"] is None
+    assert bmr.lastRead.quality == QUALITY_INVALID
+
+    bmr = scriptedBmr("/loadLows", ["garbage"] * 3, validate_retries=2)
+    with pytest.raises(Exception, match="malformed"):
+        bmr.getLowMode()
+
+
+def testValidatedReadMalformed():
+    bmr = scriptedBmr("/wholeRoom", ["\x00" + GOOD_CIRCUIT[1:], GOOD_CIRCUIT])
+    assert bmr.getCircuit(0)["enabled"] is True
+    assert bmr.lastRead.quality == QUALITY_GOOD
+    assert bmr.calls.count("/wholeRoom") == 2
+
+    bmr = scriptedBmr("/lowLoadRooms", ["00000000", "0000000011111111"])
+    assert len(bmr.getLowModeAssignments()) == 16
+    assert bmr.calls.count("/lowLoadRooms") == 2
+
+
+def testSetLowModeKeepsStart():
+    bmr = scriptedBmr("/loadLows", ["0182024-01-0107:00" + " " * 15] * 4, skip_noop_writes=True)
+    assert bmr.setLowMode(True)
+    assert not bmr.lastWrite.sent
+    server = bmr._http.post
+    sent = []
+
+    def post(url, headers=None, data=None):
+        if url == "/lowSave":
+            sent.append(data["lowData"])
+        return server(url, headers, data)
+
+    bmr._http.post = post
+    bmr.setLowMode(True, 16)
+    assert sent == ["0162024-01-0107:00" + " " * 15]
+
+
+def withoutHDO(bmr):
+    server = bmr._http.post
+
+    def post(url, headers=None, data=None):
+        response = server(url, headers, data)
+        if url == "/loadHDO":
+            response.status_code = 404
+        return response
+
+    bmr._http.post = post
+    return bmr
+
+
+def testNegativeCache():
+    bmr = withoutHDO(countingBmr(cache_ttl=0))
+    with pytest.raises(Exception, match="status code 404"):
+        bmr.getHDO()
+    with pytest.raises(UnsupportedFeatureError):
+        bmr.getHDO()
+    assert bmr.calls.count("/loadHDO") == 1
+    assert bmr.getNumOfRollerShutters() == 12
+
+    # Backoff expired
+    bmr._feature_failures["hdo"] = (1, 0)
+    with pytest.raises(Exception, match="status code 404"):
+        bmr.getHDO()
+    assert bmr._feature_failures["hdo"][0] == 2
+
+
+def testProbeCapabilities(tmp_path):
+    capabilities_file = tmp_path / "capabilities.json"
+    bmr = withoutHDO(countingBmr(capabilities_file=capabilities_file))
+    bmr._transport.probe_session.post = bmr._http.post
+    capabilities = {"hdo": False, "roller_shutters": True, "wind_sensor": True}
+    assert bmr.probeCapabilities() == capabilities
+    with pytest.raises(UnsupportedFeatureError, match="doesn't support hdo"):
+        bmr.getHDO()
+    assert bmr.calls.count("/loadHDO") == 1
+
+    bmr = countingBmr(capabilities_file=capabilities_file)
+    assert bmr.probeCapabilities() == capabilities
+    assert "/loadHDO" not in bmr.calls
+
+
+def testSkipNoopWrites():
+    bmr = countingBmr(skip_noop_writes=True)
+    assert bmr.setSummerMode(False)
+    assert not bmr.lastWrite.sent
+    assert bmr.setSummerModeAssignments([0, 1], True)
+    assert not bmr.lastWrite.sent
+    assert bmr.setCircuitSchedules(0, [8], 1)
+    assert not bmr.lastWrite.sent
+    assert bmr.setLowMode(False)
+    assert not bmr.lastWrite.sent
+    assert "/saveSummerMode" not in bmr.calls
+
+    assert bmr.setSummerMode(True)
+    assert bmr.lastWrite.sent
+    assert bmr.calls.count("/saveSummerMode") == 1
+    # Written value isn't compared with the cached reading
+    bmr.setSummerMode(True)
+    assert bmr.lastWrite.sent
+    assert bmr.calls.count("/loadSummerMode") == 2
+
+
+def testNoopWritesSentByDefault():
+    bmr = countingBmr()
+    assert bmr.setSummerMode(False)
+    assert bmr.lastWrite.sent
+    assert "/loadSummerMode" not in bmr.calls
+
+
+def testReuseUnchanged():
+    other = GOOD_CIRCUIT.replace("017.5", "018.0")
+    bmr = scriptedBmr("/wholeRoom", [GOOD_CIRCUIT, GOOD_CIRCUIT, other], reuse_unchanged=True)
+    first = bmr.getCircuit(0)
+    assert not bmr.lastRead.unchanged
+    with pytest.raises(TypeError):
+        first["temperature"] = 0
+
+    assert bmr.getCircuit(0) is first
+    assert bmr.lastRead.unchanged
+
+    changed = bmr.getCircuit(0)
+    assert changed["temperature"] == 18.0
+    assert not bmr.lastRead.unchanged
+    assert bmr.calls.count("/wholeRoom") == 3
+
+
+def testReuseUnchangedPerArguments():
+    bmr = countingBmr(cache_ttl=0, reuse_unchanged=True)
+    schedules = bmr.getCircuitSchedules(0)
+    assert isinstance(schedules["day_schedules"], tuple)
+    assert bmr.getCircuitSchedules(1) is not schedules
+    assert not bmr.lastRead.unchanged
+    assert bmr.getCircuitSchedules(0) is schedules
+    assert bmr.getLowModeAssignments() is bmr.getLowModeAssignments()
+    assert bmr.setLowModeAssignments([0, 1, 2, 3], False)
+
+
+def testConcurrentCallsDontShareLogin():
+    bmr = countingBmr(cache_ttl=0)
+    server = bmr._http.post
+    login_started = threading.Event()
+    release_login = threading.Event()
+
+    def post(url, headers=None, data=None):
+        if url == "/menu.html" and not login_started.is_set():
+            login_started.set()
+            release_login.wait(5)
+        return server(url, headers, data)
+
+    bmr._http.post = post
+    slow = threading.Thread(target=bmr.getSummerMode)
+    slow.start()
+    login_started.wait(5)
+    bmr.getHDO()
+    # The unrelated call logged in on its own before its request
+    assert bmr.calls == ["/menu.html", "/loadHDO"]
+    release_login.set()
+    slow.join()
+
+
+def testNestedCallsShareLogin():
+    bmr = countingBmr()
+    bmr.getAllRollerShutters()
+    assert bmr.calls.count("/menu.html") == 1
@@ -0,0 +1,65 @@
+from datetime import datetime
+from threading import Event, Thread
+
+from pybmr.scheduler import AdaptivePoller
+
+
+def testAdaptivePoller(bmr):
+    changes = []
+    poller = AdaptivePoller(
+        bmr, callback=lambda key, value: changes.append(key), budget=1000, min_interval=1, max_interval=8
+    )
+    poller.start()
+    for _ in range(34):
+        poller.step()
+    assert ("schedules",) in changes
+    assert ("circuit", 15) in changes
+    assert ("schedule", 8) in changes
+    assert poller.intervals[("circuit", 0)] == 1
+    assert poller.intervals[("schedule", 8)] == 8
+
+    # Unchanged readings back off
+    for _ in range(2):
+        poller.poll(("circuit", 0))
+        poller.poll(("schedule", 8))
+    assert poller.intervals[("circuit", 0)] == 4
+    assert poller.intervals[("schedule", 8)] == 32
+
+    # Changed readings are polled often again
+    poller.readings[("circuit", 0)] = dict(poller.readings[("circuit", 0)], heating=True)
+    poller.poll(("circuit", 0))
+    assert poller.intervals[("circuit", 0)] == 1
+
+
+def testSecondsToTargetChange(bmr):
+    poller = AdaptivePoller(bmr)
+    poller.poll(("circuit_schedules", 0))
+    poller.poll(("schedule", 8))
+    assert poller.secondsToTargetChange(0, datetime(2020, 1, 1, 5, 30)) == 1800
+    assert poller.secondsToTargetChange(0, datetime(2020, 1, 1, 22, 0)) == 7200
+    assert poller.secondsToTargetChange(1) is None
+
+
+def testBudgetCountsPolls(bmr):
+    poller = AdaptivePoller(bmr, budget=1000)
+    acquired = []
+    poller._limiter.acquire = lambda: acquired.append(True)
+    poller._schedule(("circuit", 0), 0)
+    assert poller.step() == ("circuit", 0)
+    assert len(acquired) == 1
+    # Other calls of the client are not limited
+    bmr.getSummerMode()
+    assert len(acquired) == 1
+    assert not bmr._hooks
+
+
+def testRunStopsWhileWaiting(bmr):
+    poller = AdaptivePoller(bmr, budget=1000, min_interval=600)
+    poller._schedule(("schedules",), 600)
+    stop = Event()
+    thread = Thread(target=poller.run, args=(stop,))
+    thread.start()
+    stop.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert len(poller._queue) == 1
@@ -0,0 +1,138 @@
+import multiprocessing
+import subprocess
+import sys
+import time
+
+import pytest
+
+from pybmr import sharded
+from pybmr.loadtest import FakeController
+from pybmr.sharded import STATUS_ERROR, STATUS_OK, STATUS_PENDING, FleetState, ShardedPoller
+from pybmr.snapshot import CircuitState
+
+
+def waitFor(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def controller():
+    controller = FakeController(circuits=4).start()
+    yield controller
+    controller.stop()
+
+
+def testFleetState():
+    state = FleetState.create(3, 2)
+    try:
+        circuits = (
+            CircuitState(0, True, True, False, False, False, 21.5, 22.0, 0.0, 5.0, 0),
+            CircuitState(1, True, False, False, True, False, None, None, 0.0, 5.0, 1),
+        )
+        assert state.read(1) == (0.0, STATUS_PENDING, 0, ())
+        state.write(1, 100.0, circuits)
+        state.write(1, 200.0)
+        reader = FleetState.attach(state.name, 3, 2)
+        assert reader.read(1) == (100.0, STATUS_ERROR, 1, circuits)
+        assert reader.readAll()[2].status == STATUS_PENDING
+        state.beat(1, 300.0)
+        assert reader.heartbeat(1) == 300.0
+        reader.close()
+    finally:
+        state.close()
+        state.shm.unlink()
+
+
+CIRCUITS = (CircuitState(0, True, True, False, False, False, 21.5, 22.0, 0.0, 5.0, 0),)
+
+
+def hangingWriter(name, writing):
+    """Start writing the slot 0 of the block `name` and hang in the middle."""
+    state = FleetState(sharded._attachSharedMemory(name, shared_tracker=True), 1, 1)
+
+    def hang(*args):
+        writing.set()
+        time.sleep(60)
+
+    sharded.packCircuit = hang
+    state.write(0, 200.0, CIRCUITS)
+
+
+def killMidWrite(state):
+    context = multiprocessing.get_context("spawn")
+    writing = context.Event()
+    process = context.Process(target=hangingWriter, args=(state.name, writing))
+    process.start()
+    assert writing.wait(30)
+    process.kill()
+    process.join()
+
+
+def testWriterKilledMidWrite():
+    state = FleetState.create(1, 1)
+    try:
+        state.write(0, 100.0, CIRCUITS)
+        killMidWrite(state)
+        state.write(0, 300.0, CIRCUITS)
+        assert state.read(0) == (300.0, STATUS_OK, 0, CIRCUITS)
+
+        killMidWrite(state)
+        state.release(0)
+        assert state.read(0) == (300.0, STATUS_ERROR, 1, ())
+        state.release(0)
+        assert state.read(0).errors == 1
+    finally:
+        state.close()
+        state.shm.unlink()
+
+
+def testAttachDoesNotUnlink():
+    state = FleetState.create(1, 1)
+    try:
+        state.write(0, 100.0, CIRCUITS)
+        code = "from pybmr.sharded import FleetState; print(FleetState.attach({!r}, 1, 1).read(0).timestamp)"
+        output = subprocess.check_output([sys.executable, "-c", code.format(state.name)], text=True)
+        assert output.strip() == "100.0"
+        reader = FleetState.attach(state.name, 1, 1)
+        assert reader.read(0).timestamp == 100.0
+        reader.close()
+    finally:
+        state.close()
+        state.shm.unlink()
+
+
+def testShardedPoller(controller):
+    controllers = [{"base_url": controller.url, "user": "admin", "password": "admin"} for _ in range(4)]
+    controllers.append({"base_url": "http://127.0.0.1:9/", "user": "admin", "password": "admin", "max_retries": 0})
+    paths = []
+    handle = controller.handle
+
+    def counting(path, data):
+        paths.append(path)
+        return handle(path, data)
+
+    controller.handle = counting
+    poller = ShardedPoller(controllers, processes=2, interval=0.1)
+    poller.stop()
+    poller.start()
+    try:
+        waitFor(lambda: all(s.status == STATUS_OK for s in poller.readAll()[:4]))
+        state = poller.read(0)
+        assert [c.id for c in state.circuits] == [0, 1, 2, 3]
+        assert state.circuits[0].temperature == pytest.approx(21.0, abs=1)
+        # A single login per poll of a controller, some polls may be in flight
+        polled = list(paths)
+        assert polled.count("/menu.html") <= polled.count("/wholeRoom") / 4 + 4
+        waitFor(lambda: poller.read(4).errors > 0)
+        assert poller.read(4).status == STATUS_ERROR
+
+        poller._workers[0].kill()
+        waitFor(lambda: poller.restarts[0] == 1)
+        timestamp = poller.read(0).timestamp
+        waitFor(lambda: poller.read(0).timestamp > timestamp)
+    finally:
+        poller.stop(timeout=5)
+    poller.stop()
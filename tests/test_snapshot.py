@@ -0,0 +1,23 @@
+from pybmr import snapshot
+
+
+def testRoundTrip(bmr):
+    state = snapshot.takeSnapshot(bmr, 1700000000.5, shutters=True)
+    assert len(state.circuits) == 16
+    assert state.circuits[0] == snapshot.CircuitState(0, True, False, False, False, False, 17.5, 32.0, 0.0, 5.0, 0)
+    assert len(state.shutters) == 12
+
+    data = snapshot.encode(state)
+    assert len(data) == snapshot.HEADER.size + 16 * snapshot.CIRCUIT.size + 12 * snapshot.SHUTTER.size
+    assert snapshot.decode(memoryview(bytearray(data))) == state
+
+
+def testDelta(bmr):
+    previous = snapshot.takeSnapshot(bmr, 1.0)
+    circuits = list(previous.circuits)
+    circuits[3] = circuits[3]._replace(heating=True, temperature=None)
+    current = previous._replace(timestamp=2.0, hdo=True, circuits=tuple(circuits))
+
+    delta = snapshot.encode(current, previous)
+    assert len(delta) == snapshot.HEADER.size + snapshot.CIRCUIT.size
+    assert snapshot.decode(delta, previous) == current
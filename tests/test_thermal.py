@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from pybmr import thermal  # noqa: E402
+
+
+def simulate(a, b, c, hours=48, step=0.1):
+    """Simulate circuits heating up to 22 degrees and cooling down to 19."""
+    n = len(a)
+    times = np.arange(0, hours, step) * 3600
+    temperatures = np.empty((len(times), n))
+    heating = np.zeros((len(times), n))
+    temperature = np.full(n, 20.0)
+    on = np.ones(n)
+    for i in range(len(times)):
+        on = np.where(temperature > 22, 0, np.where(temperature < 19, 1, on))
+        temperatures[i], heating[i] = temperature, on
+        temperature = temperature + (a * on + b * temperature + c) * step
+    return times, temperatures, heating
+
+
+def testFitHistory():
+    a, b, c = np.array([3.0, 5.0]), np.array([-0.1, -0.2]), np.array([1.0, 2.0])
+    model = thermal.ThermalModel(2)
+    model.fitHistory(*simulate(a, b, c))
+    np.testing.assert_allclose(model.coefficients, np.stack([a, b, c], axis=1), rtol=1e-3)
+    np.testing.assert_allclose(model.timeConstants, [10, 5], rtol=1e-3)
+
+    hours = model.preheatHours([19, 19], [21, 19])
+    assert hours[0] == pytest.approx(np.log(19 / 21) / -0.1, rel=1e-3)
+    assert hours[1] == 0
+    assert model.preheatHours([19, 19], [45, 45])[0] == np.inf
+    np.testing.assert_allclose(model.preheatStart([19, 19], [21, 19], [36000, 36000]), 36000 - hours * 3600)
+
+
+def testUpdate():
+    a, b, c = np.array([3.0]), np.array([-0.1]), np.array([1.0])
+    times, temperatures, heating = simulate(a, b, c, hours=24)
+    model = thermal.ThermalModel(1)
+    for t, temperature, on in zip(times, temperatures, heating):
+        model.update(t, temperature, on)
+    np.testing.assert_allclose(model.coefficients[0], [3.0, -0.1, 1.0], rtol=1e-3)
+    assert np.isnan(thermal.ThermalModel(1).coefficients).all()
+
+
+def testNextTargets(bmr):
+    targets, times = thermal.nextTargets(bmr, datetime(2020, 1, 1, 5, 30))
+    assert targets[0] == 21
+    assert times[0] == datetime(2020, 1, 1, 6, 0).timestamp()
+    assert thermal.nextTimetableEntry([{"time": "00:00", "temperature": 19}], datetime(2020, 1, 1, 5)) == (
+        datetime(2020, 1, 2),
+        19,
+    )
@@ -0,0 +1,140 @@
+import sys
+
+import pytest
+
+from pybmr.tracing import SpanTracer, createTracer
+
+
+def testHooks(bmr):
+    events = []
+    for event in ("before_call", "after_call", "before_request", "after_response", "on_parse", "on_cache_hit"):
+        bmr.addHook(event, lambda event=event, **fields: events.append((event, fields)))
+
+    bmr.getCircuit(0)
+    assert [e for e, _ in events] == [
+        "before_call",
+        "before_request",
+        "after_response",
+        "before_request",
+        "after_response",
+        "on_parse",
+        "after_call",
+    ]
+    assert events[1][1]["data"] == {"loginName": "*", "passwd": "*"}
+    assert events[3][1]["path"] == "/wholeRoom"
+    assert events[5][1]["parser"] == "parseCircuit"
+
+    del events[:]
+    bmr.getCircuit(0)
+    assert [e for e, _ in events] == ["before_call", "on_cache_hit", "after_call"]
+    assert events[1][1]["method"] == "getCircuit"
+
+
+def testHooksErrors(bmr):
+    with pytest.raises(Exception, match="Unknown hook event"):
+        bmr.addHook("on_something", print)
+
+    def failing(**fields):
+        raise RuntimeError("Hook failed")
+
+    bmr.addHook("before_call", failing)
+    assert bmr.getNumCircuits() == 16
+    bmr.removeHook("before_call", failing)
+    assert bmr._hooks == {}
+
+
+def testNoHooksNoEmit(bmr, monkeypatch):
+    def emit(event, **fields):
+        raise AssertionError("Hook emitted without hooks")
+
+    monkeypatch.setattr(bmr, "_emit", emit)
+    bmr.getCircuit(0)
+    bmr.getCircuit(0)
+
+
+def testSpanTracer(bmr):
+    tracer = SpanTracer().attach(bmr)
+    bmr.getCircuit(0)
+    bmr.getCircuit(0)
+    tracer.detach(bmr)
+    bmr.getCircuit(1)
+
+    assert [span.name for span in tracer.spans] == ["getCircuit", "getCircuit"]
+    assert [child.name for child in tracer.spans[1].children] == ["cache_hit getCircuit"]
+    call = tracer.spans[0]
+    assert [child.name for child in call.children] == [
+        "request /menu.html",
+        "request /wholeRoom",
+        "parse parseCircuit",
+    ]
+    assert call.children[1].attributes["status_code"] == 200
+    breakdown = call.breakdown()
+    assert set(breakdown) == {"self", "login", "request", "parse"}
+    assert sum(breakdown.values()) == pytest.approx(call.duration)
+    assert "request /wholeRoom" in call.format()
+
+
+def testSpanTracerNestedCalls(bmr):
+    tracer = SpanTracer().attach(bmr)
+    bmr.setSummerModeAssignments([1], True)
+    (span,) = tracer.spans
+    assert [child.name for child in span.children] == [
+        "request /menu.html",
+        "getSummerModeAssignments",
+        "request /letoSaveRooms",
+    ]
+    assert span.breakdown()["request"] > 0
+
+
+def testSpanTracerCacheHit(bmr):
+    bmr.getSummerModeAssignments()
+    tracer = SpanTracer().attach(bmr)
+    bmr.setSummerModeAssignments([1], True)
+    (span,) = tracer.spans
+    assert [child.name for child in span.children] == [
+        "request /menu.html",
+        "getSummerModeAssignments",
+        "request /letoSaveRooms",
+    ]
+    assert [child.name for child in span.children[1].children] == ["cache_hit getSummerModeAssignments"]
+    assert span.breakdown()["cache_hit"] == 0.0
+
+
+def testOpenTelemetryTracer(bmr):
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    from pybmr.tracing import OpenTelemetryTracer
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    OpenTelemetryTracer(provider.get_tracer("test")).attach(bmr)
+    bmr.getCircuit(0)
+
+    *children, call = exporter.get_finished_spans()
+    assert call.name == "getCircuit"
+    assert [span.name for span in children] == [
+        "request /menu.html",
+        "request /wholeRoom",
+        "parse parseCircuit",
+    ]
+    assert all(span.parent.span_id == call.context.span_id for span in children)
+    assert children[1].attributes["status_code"] == 200
+
+    exporter.clear()
+    bmr.getCircuit(0)
+    hit, call = exporter.get_finished_spans()
+    assert (hit.name, call.name) == ("cache_hit getCircuit", "getCircuit")
+    assert call.parent is None
+    assert hit.parent.span_id == call.context.span_id
+
+
+def testCreateTracer(bmr, monkeypatch):
+    monkeypatch.setitem(sys.modules, "opentelemetry", None)
+    tracer = createTracer(bmr)
+    assert isinstance(tracer, SpanTracer)
+    bmr.getNumCircuits()
+    assert [span.name for span in tracer.spans] == ["getNumCircuits"]